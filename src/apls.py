@@ -3,6 +3,7 @@ from utilities import *
 from graph_simplifying import *
 from graph_coordinates import *
 from graph_curvature import *
+from graph_compact import *
 from network import *
 
 # Relate nodes of G to H and inject control points if necessary.
@@ -16,70 +17,63 @@ from network import *
 @info(timer=True)
 def inject_and_relate_control_points(G, H, max_distance=4):
 
-    G_to_H = {} # All nodes of G related to a node of H.
-
-    # Construct bounding boxes on nodes and edges of H to compute neighboring nodes/edges more quickly.
-    H_node_rtree = graphnodes_to_rtree(H)
-    H_edge_rtree = graphedges_to_rtree(H)
-
-    G_node_bboxs = graphnodes_to_bboxs(G)
-    G_node_positions = extract_node_positions_dictionary(G)
-
     H_with_control_points = H.copy() # The resulting graph of H after injecting control nodes.
 
+    G_nids = get_nids(G)
+    G_to_H = {nid: None for nid in G_nids} # All nodes of G related to a node of H (initiate with an empty relation).
+
     to_inject = {}
 
-    # Find (and optionally inject) node within H nearby every node of G.
-    for G_nid, attrs in iterate_nodes(G):
+    if len(G_nids) == 0:
+        return H_with_control_points, G_to_H
+
+    # Pick the node bounding boxes (of all nodes of G at once) and pad them with the max distance.
+    G_node_positions = extract_node_positions_list(G) # (Ordered as `G_nids`.)
+    G_node_mins = G_node_positions - (max_distance + 0.0001)
+    G_node_maxs = G_node_positions + (max_distance + 0.0001)
+
+    # Try to find nearby node (in H) nearby control point (of G).
+    H_node_rtree = graphnodes_to_cached_rtree(H)
+    hits, counts = H_node_rtree.intersection_v(G_node_mins, G_node_maxs)
+    counts = counts.astype(int)
+    offsets = np.cumsum(counts) - counts
+    for i in np.flatnonzero(counts > 0):
+        G_to_H[G_nids[i]] = int(hits[offsets[i]]) # Take first intersection result.
+
+    # Try to find edge (in H) nearby remaining control points (of G).
+    unrelated = np.flatnonzero(counts == 0)
+    segments = graph_linesegments_to_arrays(H)
+    if len(unrelated) > 0 and len(segments["eids"]) > 0:
+
+        # Crude subselection/filtering by bounding boxes of line-segments of H.
+        H_segment_rtree = linesegments_to_rtree(segments["p"], segments["q"])
+        hits, counts = H_segment_rtree.intersection_v(G_node_mins[unrelated], G_node_maxs[unrelated])
+        counts = counts.astype(int)
+        nodes = np.repeat(unrelated, counts) # Index of G node per (node, line-segment) candidate pair.
 
-        # Initiate an empty relation.
-        G_to_H[G_nid] = None
+        # Closely check curvatures.
+        distances, intervals, _ = project_points_onto_linesegments(G_node_positions[nodes], segments["p"][hits], segments["q"][hits])
 
-        # Pick the node bounding box and pad it with the max distance.
-        G_node_bbox = G_node_bboxs[G_nid]
-        G_node_bbox = pad_bounding_box(G_node_bbox, max_distance + 0.0001)
+        # Seek lowest value per node (sort by node and then by distance, pick the first of every node).
+        order = np.lexsort((distances, nodes))
+        nodes, hits, distances, intervals = nodes[order], hits[order], distances[order], intervals[order]
+        for j in np.flatnonzero(np.diff(nodes, prepend=-1)):
 
-        G_node_position = G_node_positions[G_nid]
+            # Check distance is below threshold.
+            if distances[j] > max_distance - 0.0001: # Otherwise this node of G has no relation to H.
+                continue # No nearby edge curvatures checked precisely by curvature.
 
-        # Try to find nearby node (in H) nearby control point (of G).
-        intersections = intersect_rtree_bbox(H_node_rtree, G_node_bbox)
-        if len(intersections) > 0: 
-            # Extract nid from intersection result.
-            H_nid = intersections[0]
-            G_to_H[G_nid] = H_nid
-            continue
-    
-        # Try to find edge (in H) nearby control point (of G).
-        # Crude subselection/filtering by bounding boxes.
-        intersections = intersect_rtree_bbox(H_edge_rtree, G_node_bbox)
-        if len(intersections) == 0:
-            continue # No nearby edge curvatures per bounding box.
-    
-        # Closely check curvatures.
-        H_eids = intersections
-        curves = [attrs["curvature"] for eid, attrs in iterate_edges(H) if eid in set(H_eids)]
-        curve_points, curve_intervals = unzip([nearest_position_and_interval_on_curve_to_point(curve, G_node_position) for curve in curves])
-        distances = [norm(curve_point - G_node_position) for curve_point in curve_points]
-
-        # Seek lowest value.
-        i, distance = min(enumerate(distances), key=lambda x: x[1])
-
-        # Check distance is below threshold.
-        if distance > max_distance - 0.0001: # Otherwise this node of G has no relation to H.
-            continue # No nearby edge curvatures checked precisely by curvature.
-            
-        # Values of selected curve (which lies sufficiently close to the point of interest).
-        H_eid = H_eids[i]
-        curve = curves[i]
-        curve_point = curve_points[i]
-        curve_interval = curve_intervals[i]
-
-        # Store interval (at which to cut the edge) to perform later.
-        item = (curve_interval, G_nid)
-        if H_eid in to_inject:
-            to_inject[H_eid].append(item)
-        else:
-            to_inject[H_eid] = [item]
+            # Values of selected curve (which lies sufficiently close to the point of interest).
+            segment = hits[j]
+            H_eid = segments["eids"][segments["edge"][segment]]
+            curve_interval = float(segments["start"][segment] + intervals[j] * segments["weight"][segment])
+
+            # Store interval (at which to cut the edge) to perform later.
+            item = (curve_interval, G_nids[nodes[j]])
+            if H_eid in to_inject:
+                to_inject[H_eid].append(item)
+            else:
+                to_inject[H_eid] = [item]
 
     # Perform injection and linking.
     for H_eid in to_inject.keys():
@@ -104,24 +98,41 @@ def inject_and_relate_control_points(G, H, max_distance=4):
 # Prepare graph for APLS computations.
 # Note: Checks for the "prepared" attribute on whether it is already prepared.
 #       This can be a great performance gain on e.g. re-using a ground truth graph.
-def prepare_graph_for_apls(G):
+# Note: With `use_cache` the prepared graph is read from (or written to) the prepared graph cache on disk (see `read_or_prepare_graph`).
+#       Bump `prepared_graph_version` when changing what this preparation produces.
+# Note: With `inplace` the graph itself is prepared (see `graph_to_transform`), every preparation step then acts on the graph we own.
+def prepare_graph_for_apls(G, max_length=50, use_cache=False, inplace=False):
 
     if "prepared" in G.graph and G.graph["prepared"] == "apls":
 
         return G
 
-    G = G.copy()
+    # Control points are injected into (networkx) graphs, so a compact graph is converted (thereby we own it).
+    if type(G) == CompactGraph:
+        G = compact_to_graph(G)
+        inplace = True
+
+    if use_cache:
+        return read_or_prepare_graph(G, lambda: prepare_graph_for_apls(G, max_length=max_length, inplace=inplace), prepared="apls", max_length=max_length, coordinates="utm")
+
+    # Take ownership of the graph once (by the first step to adjust it), later steps act on the graph we own.
+    owned = inplace
 
     if not G.graph["coordinates"] == "utm":
-        G = graph_transform_latlon_to_utm(G)
+        G = graph_transform_latlon_to_utm(G, inplace=owned)
+        owned = True
 
     if not G.graph["simplified"]:
-        G = simplify_graph(G)
+        G = simplify_graph(G, inplace=owned)
+        owned = True
+
+    if not owned:
+        G = graph_to_transform(G)
 
     sanity_check_edge_length(G)
     sanity_check_node_positions(G)
 
-    G = graph_ensure_max_edge_length(G, max_length=50)
+    G = graph_ensure_max_edge_length(G, max_length=max_length)
 
     sanity_check_edge_length(G)
     sanity_check_node_positions(G)
@@ -146,6 +157,9 @@ def prepare_graph_data(G, H):
     # Note: All nodes (of the simplified graph) are control points.
     Hc, G_to_Hc = inject_and_relate_control_points(G, H)
 
+    # The prepared data is shared by all subsequent APLS computations (without copying), so prevent accidental mutation of Hc.
+    nx.freeze(Hc)
+
     return {
         "G": G,
         "Hc": Hc,
@@ -154,20 +168,36 @@ def prepare_graph_data(G, H):
 
 
 # Compute shortest path data (between all pairs of start-end nodes within a selection of node identifiers).
+# * Use `backend="csgraph"` to compute all shortest paths at once (see `precompute_shortest_path_matrix`).
 @info(timer=True)
-def precompute_shortest_path_data(G, control_nids):
+def precompute_shortest_path_data(G, control_nids, backend="networkx", limit=inf):
+
+    if backend not in ["networkx", "csgraph"]:
+        raise Exception(f"Expect shortest path backend to be either 'networkx' or 'csgraph', got '{backend}'.")
 
     # Sanity check control nids exist in graph.
     for nid in control_nids:
         if nid not in G.nodes():
             raise Exception(f"Control nid {nid} does not exist in the graph.")
 
+    if backend == "csgraph":
+
+        control_nids = list(control_nids)
+        matrix = precompute_shortest_path_matrix(G, control_nids, limit=limit)
+
+        # Convert into the same dictionary format (reachable end nodes with a higher node identifier).
+        distance_matrix = {}
+        for i, u in enumerate(control_nids):
+            distance_matrix[u] = {v: float(matrix[i, j]) for j, v in enumerate(control_nids) if v > u and matrix[i, j] < inf}
+
+        return distance_matrix
+
     # Compute distance matrix between these points.
     distance_matrix = {}
     for u in control_nids:
 
         # Compute all reachable points from this node.
-        distances = nx.single_source_dijkstra_path_length(G, u, weight="length")
+        distances = nx.single_source_dijkstra_path_length(G, u, weight="length", cutoff=limit if limit < inf else None)
 
         # Filter out dictionary to only include end nodes which are:
         # * Contained in the control nodes list.
@@ -182,36 +212,106 @@ def precompute_shortest_path_data(G, control_nids):
     return distance_matrix
 
 
+# Compute shortest path distances between all pairs of control nodes with a single multi-source Dijkstra on the CSR adjacency matrix.
+# * Returns a dense matrix where entry `[i, j]` is the distance from `control_nids[i]` to `control_nids[j]` (`inf` if unreachable).
+# * Optionally `limit` the path length to search for (paths beyond are considered unreachable).
+# * Use `backend="networkx"` to fill the matrix with a Dijkstra per control node instead.
+# * A compact graph (see `CompactGraph`) is always searched on its own CSR adjacency matrix.
+@info(timer=True)
+def precompute_shortest_path_matrix(G, control_nids, limit=inf, dtype=np.float32, backend="csgraph"):
+
+    if backend not in ["networkx", "csgraph"]:
+        raise Exception(f"Expect shortest path backend to be either 'networkx' or 'csgraph', got '{backend}'.")
+
+    n = len(control_nids)
+
+    if type(G) == CompactGraph:
+
+        if n == 0:
+            return np.zeros((0, 0), dtype=dtype)
+
+        indices = G.node_indices(control_nids)
+        distances = csgraph.dijkstra(G.csr_matrix(), directed=False, indices=indices, limit=limit)
+
+        return distances[:, indices].astype(dtype)
+
+    if backend == "networkx":
+
+        nid_to_index = {nid: i for i, nid in enumerate(control_nids)}
+        distances = np.full((n, n), inf)
+        for i, u in enumerate(control_nids):
+            for v, distance in nx.single_source_dijkstra_path_length(G, u, weight="length", cutoff=limit if limit < inf else None).items():
+                if v in nid_to_index:
+                    distances[i, nid_to_index[v]] = distance
+
+        return distances.astype(dtype)
+
+    if n == 0:
+        return np.zeros((0, 0), dtype=dtype)
+
+    adjacency, nids = graph_to_csr_matrix(G, weight="length")
+    nid_to_index = {nid: i for i, nid in enumerate(nids)}
+    indices = array([nid_to_index[nid] for nid in control_nids], dtype=int)
+
+    distances = csgraph.dijkstra(adjacency, directed=False, indices=indices, limit=limit)
+
+    return distances[:, indices].astype(dtype)
+
+
 # Perform all samples and categorize them into the three categories:
 # * A. Proposed graph does not have a control point.
 # * B. Proposed graph does not have a path between control points.
 # * C. Both graphs have control points and a path between them.
+# Every pair of control nodes of G (start lower than end) with a path in between in G is a sample.
+# * Distances are shortest path matrices, indexed by position in `G_control_nids` and `Hc_control_nids`.
+# * Returns the number of samples per category alongside the path score of every sample in category C.
 @info(timer=True)
-def perform_sampling(G, Hc, G_to_Hc, G_shortest_paths, Hc_shortest_paths):
+def perform_sampling(G_to_Hc, G_control_nids, Hc_control_nids, G_distances, Hc_distances):
 
-    sample_paths = {} # The start and end node pair related to a sample. This is taken from the G graph (so to reconstruct for Hc you require to apply G_to_Hc).
+    n = len(G_control_nids)
+
+    # Index of the related control node in Hc for every control node of G (`-1` if it has no relation).
+    Hc_index = {nid: i for i, nid in enumerate(Hc_control_nids)}
+    related  = array([Hc_index[G_to_Hc[nid]] if G_to_Hc[nid] != None else -1 for nid in G_control_nids], dtype=int)
+    covered  = related >= 0
+
+    # Pairs of start and end control node with a path in the ground truth.
+    sampled = np.triu(np.ones((n, n), dtype=bool), k=1) & (G_distances < inf)
+
+    # Distance between the related control nodes in the proposed graph (`inf` if either has no relation).
+    Hc_pair_distances = np.full((n, n), inf)
+    if covered.any():
+        Hc_pair_distances[np.ix_(covered, covered)] = Hc_distances[np.ix_(related[covered], related[covered])]
+    has_path = Hc_pair_distances < inf
 
-    nids = set(list(G_to_Hc.keys())) # The control points we sample (and thus seek paths between).
-    nids_not_covered = set([nid for nid in nids if G_to_Hc[nid] == None]) 
-    nids_covered     = nids - nids_not_covered
-    
     ## Category A: No control point in the proposed graph.
-    sample_paths["A"] = [(start, end) for start in nids_not_covered for end in G_shortest_paths[start]]
+    A = sampled & ~covered[:, None]
 
-    ## Category B: Control nodes exist and a path exists in the ground truth, but not in the proposed graph. 
-    sample_paths["B"] = [(start, end) for start in nids_covered for end in G_shortest_paths[start] if G_to_Hc[end] not in Hc_shortest_paths[G_to_Hc[start]]]
+    ## Category B: Control nodes exist and a path exists in the ground truth, but not in the proposed graph.
+    B = sampled & covered[:, None] & ~has_path
 
     ## Category C: Both graphs have control points and a path between them.
-    sample_paths["C"] = [(start, end) for start in nids_covered for end in G_shortest_paths[start] if G_to_Hc[end] in Hc_shortest_paths[G_to_Hc[start]]]
+    C = sampled & has_path
+
+    # Compute path score.
+    a = G_distances[C].astype(float)
+    b = Hc_pair_distances[C]
+    path_scores = 1 - np.minimum(np.abs(a - b) / a, 1)
+
+    samples = {
+        "A": int(np.count_nonzero(A)),
+        "B": int(np.count_nonzero(B)),
+        "C": int(np.count_nonzero(C)),
+    }
 
-    return sample_paths
+    return samples, path_scores
 
 
 # Asymmetric APLS computes by only considering the control nodes into the proposed graph.
 # * Optionally provide a predetermined set of control nodes.
 # * Optionally extract control nodes specifically viable for computing prime (thus control point is related to proposed graph).
 @info(timer=True)
-def apls_asymmetric_sampling(prepared_graph_data, n=500, prime=False):
+def apls_asymmetric_sampling(prepared_graph_data, n=500, prime=False, backend="networkx"):
 
     # Prepared graph data for sampling.
     G = prepared_graph_data["G"]
@@ -228,42 +328,32 @@ def apls_asymmetric_sampling(prepared_graph_data, n=500, prime=False):
     
     G_control_nids = set(random.sample(nids_to_sample_from, min(n, len(nids_to_sample_from))))
     
-    # Take subset of `G_to_Hc` to the control nodes (these are the only nodes we have to relate with another).
-    for nid in [nid for nid in G_to_Hc.keys()]:
-        if nid not in G_control_nids:
-            G_to_Hc.pop(nid)
-    
     # Sanity check that all control nids of G are contained in the G-to-Hc mapping.
     for nid in G_control_nids:
         if nid not in G_to_Hc:
             raise Exception(f"Expect all nids of G_control_nids to be present in G_to_Hc.")
     
-    # Obtain control nids to use in `H`.
-    Hc_control_nids = set([G_to_Hc[nid] for nid in G_control_nids if G_to_Hc[nid] != None])
-
-    # Compute shortest paths between this set of control nodes.
-    G_shortest_paths = precompute_shortest_path_data(G, G_control_nids)
-    Hc_shortest_paths = precompute_shortest_path_data(Hc, Hc_control_nids)
+    # Take subset of `G_to_Hc` to the control nodes (these are the only nodes we have to relate with another).
+    # Note: We construct a new mapping, the prepared graph data is left untouched (and thereby reusable without copying).
+    G_to_Hc = {nid: G_to_Hc[nid] for nid in G_control_nids}
 
-    # Perform sampling.
-    samples = perform_sampling(G, Hc, G_to_Hc, G_shortest_paths, Hc_shortest_paths)
+    # Obtain control nids to use in `H` (Sorted, so samples have start nid lower than end nid).
+    G_control_nids  = sorted(G_control_nids)
+    Hc_control_nids = sorted(set([G_to_Hc[nid] for nid in G_control_nids if G_to_Hc[nid] != None]))
 
-    # Compute path score.
-    # Note: This function is bound to scope (it relies on variables in scope) to keep things simple.
-    def score(start, end):
-        a = G_shortest_paths[start][end]
-        b = Hc_shortest_paths[G_to_Hc[start]][G_to_Hc[end]]
-        value = 1 - min(abs(a - b) / a, 1)
-        return value
+    # Compute shortest paths between this set of control nodes.
+    G_distances  = precompute_shortest_path_matrix(G, G_control_nids, backend=backend)
+    Hc_distances = precompute_shortest_path_matrix(Hc, Hc_control_nids, backend=backend)
 
-    # Compute metric.
-    path_scores      = [score(start, end) for (start, end) in samples["C"]]
+    # Perform sampling and compute path scores.
+    samples, path_scores = perform_sampling(G_to_Hc, G_control_nids, Hc_control_nids, G_distances, Hc_distances)
 
     # Arbitrary data for debugging/visualization purposes.
     data = {
         "samples": samples,
         "path_scores": path_scores,
         "G_control_nids": G_control_nids,
+        "G_to_Hc": G_to_Hc,
         "prepared_graph_data": prepared_graph_data
     }
     
@@ -275,33 +365,31 @@ def compute_score(data, prime=False):
 
     path_scores = data["path_scores"]
     samples     = data["samples"]
-    sample_sum  = sum(path_scores)
+    sample_sum  = float(np.sum(path_scores))
 
     if prime:
-        n = len(samples["B"]) + len(samples["C"])
+        n = samples["B"] + samples["C"]
     else:
-        n = len(samples["B"]) + len(samples["C"]) + len(samples["A"])
+        n = samples["B"] + samples["C"] + samples["A"]
 
-    score = sample_sum / (len(samples["B"]) + len(samples["C"]) + len(samples["A"]))
+    score = sample_sum / (samples["B"] + samples["C"] + samples["A"])
     
     return score
 
 
 # Compute the APLS metric (a similarity value between two graphs in the range [0, 1]).
 @info(timer=True)
-def apls(G, H, n=500, prime=False, prepared_graph_data=None):
+def apls(G, H, n=500, prime=False, prepared_graph_data=None, backend="networkx"):
 
+    # Note: Prepared graph data is only read from, so it can be shared among (APLS and APLS-prime) computations.
     if prepared_graph_data == None:
         prepared_graph_data = {
             "left" : prepare_graph_data(G, H),
             "right": prepare_graph_data(H, G),
         }
-    else:
-        # Deep copy to prevent mangling (`apls_asymmetric_sampling` pops unneeded nids from `G_to_Hc`).
-        prepared_graph_data = deepcopy(prepared_graph_data)
 
-    left  = apls_asymmetric_sampling(prepared_graph_data["left"] , n=n, prime=prime)
-    right = apls_asymmetric_sampling(prepared_graph_data["right"], n=n, prime=prime)
+    left  = apls_asymmetric_sampling(prepared_graph_data["left"] , n=n, prime=prime, backend=backend)
+    right = apls_asymmetric_sampling(prepared_graph_data["right"], n=n, prime=prime, backend=backend)
 
     score = 0.5 * (compute_score(left, prime=prime) + compute_score(right, prime=prime))
 
@@ -1,4 +1,5 @@
 import utm
+import numpy as np
 
 roi = {
     "athens" : {'west': 23.77222618197142, 'south': 37.99243374688059, 'east': 23.840460380116067, 'north': 38.037610439228885},
@@ -51,6 +52,20 @@ def latlon_to_coord(latlon):
 
 latlon_to_utm = latlon_to_coord
 
+# Convert arrays of latitudes and longitudes into arrays of local coordinates (y, x).
+# * All coordinates are converted within the UTM zone of the first coordinate.
+def latlons_to_coords(lats, lons):
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    if len(lats) == 0:
+        return lats.copy(), lons.copy()
+    zone_number = utm.latlon_to_zone_number(lats[0], lons[0])
+    zone_letter = utm.latitude_to_zone_letter(lats[0])
+    assert np.all(np.floor((lons + 180) / 6) == np.floor((lons[0] + 180) / 6)) # Expect all coordinates to lie within the same UTM zone.
+    xs, ys, _, _ = utm.conversion.from_latlon(lats, lons, force_zone_number=zone_number, force_zone_letter=zone_letter)
+    return ys, xs
+
+latlons_to_utms = latlons_to_coords
+
 # Convert utm to latlon by zone and number information.
 def coord_to_latlon_by_utm_info(coordinate, number=None, letter=None):
     y, x = coordinate
@@ -59,6 +74,16 @@ def coord_to_latlon_by_utm_info(coordinate, number=None, letter=None):
 
 utm_to_latlon_by_utm_info = coord_to_latlon_by_utm_info
 
+# Convert arrays of local coordinates (y, x) into arrays of latitudes and longitudes by zone and number information.
+def coords_to_latlons_by_utm_info(ys, xs, number=None, letter=None):
+    ys, xs = np.asarray(ys, dtype=np.float64), np.asarray(xs, dtype=np.float64)
+    if len(ys) == 0:
+        return ys.copy(), xs.copy()
+    lats, lons = utm.conversion.to_latlon(xs, ys, number, zone_letter=letter)
+    return lats, lons
+
+utms_to_latlons_by_utm_info = coords_to_latlons_by_utm_info
+
 # Update latlon by translating it in meters (uses UTM projection for this).
 def translate_latlon_by_meters(lat=None, lon=None, west=None, north=None, east=None, south=None):
 
@@ -27,6 +27,8 @@ def get_graph_path(graphset=None, place=None):
 # Construct graph from edges.txt and vertex.txt text file in specified folder. 
 # Expect those files to be CSV with u,v and id,x,y columns respectively.
 # We act only on undirected vectorized graphs.
+# * Columns are read as arrays and nodes/edges (with curvature and length) are added in bulk.
+# * Edge geometry is derived from curvature on access.
 @info(timer=True)
 def read_graph(graphset=None, place=None, use_utm=False):
 
@@ -35,24 +37,40 @@ def read_graph(graphset=None, place=None, use_utm=False):
     vertices_file_path = folder + "/vertices.txt"
 
     # Expect the text files are CSV formatted
-    edges_df = pd.read_csv(edges_file_path)
-    vertices_df = pd.read_csv(vertices_file_path)
+    if use_utm:
+        vertices_df = pd.read_csv(vertices_file_path, usecols=["id", "x", "y"])
+        ys, xs = vertices_df["y"].to_numpy(dtype=np.float64), vertices_df["x"].to_numpy(dtype=np.float64)
+    else:
+        vertices_df = pd.read_csv(vertices_file_path, usecols=["id", "lat", "lon"])
+        ys, xs = vertices_df["lat"].to_numpy(dtype=np.float64), vertices_df["lon"].to_numpy(dtype=np.float64)
+    nids = vertices_df["id"].to_numpy(dtype=np.int64)
+
+    edges_df = pd.read_csv(edges_file_path, usecols=["u", "v"])
+    us, vs = edges_df["u"].to_numpy(dtype=np.int64), edges_df["v"].to_numpy(dtype=np.int64)
 
     # Construct NetworkX graph.
     G = nx.Graph()
-
-    # Track node dictionary to simplify node extraction when computing edge lengths.
-    for node in vertices_df.iterrows():
-        if use_utm:
-            i, x, y = itemgetter('id', 'x', 'y')(node[1]) 
-            G.add_node(int(i), y=y, x=x)
-        else:
-            i, lat, lon = itemgetter('id', 'lat', 'lon')(node[1]) 
-            G.add_node(int(i), y=lat, x=lon)
-
-    for edge in edges_df.iterrows():
-        u, v = itemgetter('u', 'v')(edge[1]) 
-        G.add_edge(int(u), int(v))
+    G.add_nodes_from((nid, {"y": y, "x": x}) for nid, y, x in zip(nids.tolist(), ys.tolist(), xs.tolist()))
+
+    # Undirected edges with lowest node identifier first (duplicates dropped, first occurrence order retained).
+    us, vs = np.minimum(us, vs), np.maximum(us, vs)
+    _, indices = np.unique(np.column_stack((us, vs)), axis=0, return_index=True)
+    indices = np.sort(indices)
+    us, vs = us[indices], vs[indices]
+
+    # Position of edge endpoints.
+    order = np.argsort(nids)
+    positions = np.column_stack((ys, xs))[order]
+    check(np.all(np.isin(us, nids)) and np.all(np.isin(vs, nids)), expect="Expect all edge endpoints to be listed as vertices.")
+    ps = positions[np.searchsorted(nids[order], us)]
+    qs = positions[np.searchsorted(nids[order], vs)]
+
+    # Edge curvature and length (zero-length self-loops are dropped).
+    curvatures = np.stack((ps, qs), axis=1)
+    lengths = np.linalg.norm(qs - ps, axis=1)
+    keep = ~((us == vs) & (lengths == 0))
+    check(np.all(lengths[keep] > 0), expect="Expect non-zero edge length.")
+    G.add_edges_from((u, v, {"curvature": curvature, "length": length}) for u, v, curvature, length in zip(us[keep].tolist(), vs[keep].tolist(), curvatures[keep], lengths[keep].tolist()))
 
     # G = nx.MultiDiGraph(G)
     # G = ox.simplify_graph(G)
@@ -61,11 +79,6 @@ def read_graph(graphset=None, place=None, use_utm=False):
     G.graph["coordinates"] = "latlon"
     G.graph["simplified"] = False
 
-    # Annotate edges.
-    graph_annotate_edge_curvature(G)
-    graph_annotate_edge_length(G)
-    graph_annotate_edge_geometry(G)
-
     return G
 
 
@@ -127,6 +140,238 @@ def pickle_to_graph(data):
     return G
     
 
+### Columnar graph storage.
+
+# Convert a list of attribute values into a typed column (falls back to pickled bytes for arbitrary objects).
+# * Returns the kind of column alongside the column itself.
+# * Values of mixed types (e.g. ints and floats) are stored as objects, so every value is restored with its own type.
+def values_to_column(values):
+
+    kinds = set(type(value) for value in values)
+
+    if kinds <= {bool, np.bool_}:
+        return "bool", array(values, dtype=bool)
+    if kinds <= {int, np.int64}:
+        return "int", array(values, dtype=np.int64)
+    if kinds <= {float, np.float64}:
+        return "float", array(values, dtype=np.float64)
+    if kinds <= {str}:
+        return "str", array(values, dtype=str)
+
+    return "object", np.frombuffer(pickle.dumps(values), dtype=np.uint8)
+
+
+# Convert a typed column back into a list of attribute values.
+def column_to_values(kind, column):
+    if kind == "object":
+        return pickle.loads(column.tobytes())
+    return column.tolist()
+
+
+# Convert graph into columns (a dictionary of arrays) to store as `.npz`.
+# * Nodes: Identifier and position arrays.
+# * Edges: `u`, `v`, `k` arrays and a single curvature buffer (all curvature concatenated) with offsets per edge.
+# * Remaining node/edge attributes: One typed column per attribute with a mask on which nodes/edges have the attribute.
+# * Edge geometry is not stored, it is derived from the curvature on access.
+def graph_to_columns(G):
+
+    nodes = list(iterate_nodes(G))
+    edges = list(iterate_edges(G))
+
+    columns = {
+        "graph"     : np.frombuffer(pickle.dumps(G.graph), dtype=np.uint8),
+        "node_id"   : array([nid for nid, _ in nodes], dtype=np.int64),
+        "node_y"    : array([attrs["y"] for _, attrs in nodes], dtype=np.float64),
+        "node_x"    : array([attrs["x"] for _, attrs in nodes], dtype=np.float64),
+        "edge_u"    : array([eid[0] for eid, _ in edges], dtype=np.int64),
+        "edge_v"    : array([eid[1] for eid, _ in edges], dtype=np.int64),
+        "edge_k"    : array([eid[2] if len(eid) == 3 else 0 for eid, _ in edges], dtype=np.int64),
+    }
+
+    # Curvature buffer with offsets (edge `i` has curvature `curvature[offsets[i]:offsets[i+1]]`).
+    curvatures = [np.asarray(attrs["curvature"], dtype=np.float64).reshape(-1, 2) for _, attrs in edges]
+    columns["curvature_offsets"] = np.concatenate(([0], np.cumsum([len(ps) for ps in curvatures], dtype=np.int64)))
+    columns["curvature"] = np.concatenate(curvatures) if len(curvatures) > 0 else np.zeros((0, 2))
+
+    # Typed attribute columns.
+    for prefix, items, skip in [("node", nodes, {"y", "x"}), ("edge", edges, {"curvature", "geometry", "geometry_curvature"})]:
+        names = sorted(set(name for _, attrs in items for name in attrs) - skip)
+        for name in names:
+            mask = array([name in attrs for _, attrs in items], dtype=bool)
+            kind, column = values_to_column([attrs[name] for _, attrs in items if name in attrs])
+            columns[f"{prefix}_mask:{kind}:{name}"] = mask
+            columns[f"{prefix}_attr:{kind}:{name}"] = column
+
+    return columns
+
+
+# Convert columns (retrieved from `.npz` data) into a graph.
+def columns_to_graph(columns):
+
+    graph = pickle.loads(columns["graph"].tobytes())
+
+    if graph["simplified"]:
+        G = nx.MultiGraph()
+    else:
+        G = nx.Graph()
+    G.graph = graph
+
+    # Restore attributes of nodes and edges from the typed attribute columns.
+    def restore_attributes(prefix, n):
+        attributes = [{} for _ in range(n)]
+        for key in columns:
+            if key.startswith(f"{prefix}_attr:"):
+                _, kind, name = key.split(":", 2)
+                mask = columns[f"{prefix}_mask:{kind}:{name}"]
+                for i, value in zip(np.flatnonzero(mask), column_to_values(kind, columns[key])):
+                    attributes[i][name] = value
+        return attributes
+
+    node_ids = columns["node_id"].tolist()
+    node_attributes = restore_attributes("node", len(node_ids))
+    G.add_nodes_from((nid, {**attrs, "y": y, "x": x}) for nid, y, x, attrs in zip(node_ids, columns["node_y"].tolist(), columns["node_x"].tolist(), node_attributes))
+
+    us, vs, ks = columns["edge_u"].tolist(), columns["edge_v"].tolist(), columns["edge_k"].tolist()
+    edge_attributes = restore_attributes("edge", len(us))
+    offsets = columns["curvature_offsets"]
+    curvature = columns["curvature"]
+    for i, attrs in enumerate(edge_attributes):
+        attrs["curvature"] = curvature[offsets[i]:offsets[i + 1]]
+
+    if graph["simplified"]:
+        G.add_edges_from(zip(us, vs, ks, edge_attributes))
+    else:
+        G.add_edges_from(zip(us, vs, edge_attributes))
+
+    return G
+
+
+# Write graph to disk in columnar format.
+# * Written to a temporary file first and then moved, so an existing memory-mapped version of the file stays valid.
+def write_graph_columns(G, filename):
+    G = as_networkx_graph(G)
+    with open(f"{filename}.tmp", "wb") as file:
+        np.savez(file, **graph_to_columns(G))
+    os.replace(f"{filename}.tmp", filename)
+
+
+# Read graph from disk in columnar format.
+def read_graph_columns(filename):
+    with np.load(filename) as data:
+        return columns_to_graph({key: data[key] for key in data.files})
+
+
+### Memory-mapped lazy graph loading.
+
+# Memory-map every array of an (uncompressed) `.npz` file.
+# * Arrays are mapped copy-on-write, so modifications stay in memory and never reach the file.
+def memmap_npz(filename):
+
+    columns = {}
+    with open(filename, "rb") as file, zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise Exception(f"Expect {filename} to be stored uncompressed to memory-map it (array {info.filename} is compressed).")
+            # Skip the local file header (fixed size of 30 bytes followed by filename and extra field).
+            file.seek(info.header_offset)
+            header = file.read(30)
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            # Read the `.npy` header to obtain the layout of the array.
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            offset = file.tell()
+            name = info.filename.removesuffix(".npy")
+            if math.prod(shape) == 0:
+                columns[name] = np.zeros(shape, dtype=dtype)
+            else:
+                columns[name] = np.memmap(filename, dtype=dtype, mode="c", shape=shape, order="F" if fortran_order else "C", offset=offset)
+
+    return columns
+
+
+# Graph stored in columnar format which is memory-mapped and only converted into a networkx graph on first access.
+# * Node positions and curvature are directly accessible as arrays without constructing the networkx graph.
+# * Any other attribute/method is forwarded to the (then materialised) networkx graph.
+class LazyGraph:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.columns  = memmap_npz(filename)
+        self._graph   = None
+
+    # Node identifiers.
+    def node_ids(self):
+        return self.columns["node_id"]
+
+    # Node positions as an array of (y, x) (in the same order as `node_ids`).
+    def node_positions(self):
+        return np.column_stack((self.columns["node_y"], self.columns["node_x"]))
+
+    # Edge identifiers as `u`, `v` and `k` arrays.
+    def edge_ids(self):
+        return self.columns["edge_u"], self.columns["edge_v"], self.columns["edge_k"]
+
+    # Curvature buffer with offsets (edge `i` has curvature `curvature[offsets[i]:offsets[i+1]]`).
+    def curvature_buffer(self):
+        return self.columns["curvature"], self.columns["curvature_offsets"]
+
+    # Whether the networkx graph has been constructed.
+    def is_materialised(self):
+        return self._graph != None
+
+    # Networkx graph (constructed on first access).
+    @property
+    def networkx(self):
+        if self._graph == None:
+            self._graph = columns_to_graph(self.columns)
+        return self._graph
+
+    # Drop the constructed networkx graph (to free memory), the memory-mapped arrays remain accessible.
+    def release(self):
+        self._graph = None
+
+    def __getattr__(self, name):
+        # Prevent recursion on attributes accessed before `__init__` completed (e.g. when unpickling).
+        if name in ["filename", "columns", "_graph"]:
+            raise AttributeError(name)
+        return getattr(self.networkx, name)
+
+    def __len__(self):
+        return len(self.networkx)
+
+    def __iter__(self):
+        return iter(self.networkx)
+
+    def __contains__(self, nid):
+        return nid in self.networkx
+
+    def __getitem__(self, nid):
+        return self.networkx[nid]
+
+    # Pickle by filename, the arrays are memory-mapped again on unpickling.
+    def __getstate__(self):
+        return {"filename": self.filename}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"])
+
+
+# Read graph from disk in columnar format as memory-mapped lazy graph.
+def read_graph_columns_lazy(filename):
+    return LazyGraph(filename)
+
+
+# Obtain graph as networkx graph (materialising it in case of a lazy graph).
+def as_networkx_graph(G):
+    if type(G) == LazyGraph:
+        return G.networkx
+    return G
+
+
 # Obtain file age (since last write).
 def file_age(filename):
     if not os.path.exists(filename):
@@ -136,10 +381,18 @@ def file_age(filename):
 
 
 # Read and/or write with a specific action to perform in case we failed to read.
+# * Graphs are stored in columnar format (`.npz`), other results are pickled (`.pkl`).
+# * With `lazy`, a graph read from disk is returned as memory-mapped `LazyGraph`.
 @info()
-def read_and_or_write(filename, action, use_storage=True, is_graph=True, overwrite=False, rerun=False, reset_time=None, overwrite_if_old=False):
+def read_and_or_write(filename, action, use_storage=True, is_graph=True, overwrite=False, rerun=False, reset_time=None, overwrite_if_old=False, lazy=False):
     
-    filename = f"{filename}.pkl"
+    # Graphs previously stored as pickle are read (and then converted to the columnar format).
+    legacy_filename = f"{filename}.pkl"
+    filename = f"{filename}.npz" if is_graph else f"{filename}.pkl"
+    if is_graph and not os.path.exists(filename) and os.path.exists(legacy_filename):
+        result = pickle_to_graph(pickle.load(open(legacy_filename, "rb")))
+        logger(f"Converting {legacy_filename} into {filename}")
+        write_graph_columns(result, filename)
 
     result = None
     file_exists = os.path.exists(filename)
@@ -156,8 +409,10 @@ def read_and_or_write(filename, action, use_storage=True, is_graph=True, overwri
     if file_exists and use_storage and not rerun: # No need to read if we are going to rerun.
         logger("Try reading file from disk.")
         try:
-            if is_graph:
-                result = pickle_to_graph(pickle.load(open(filename, "rb")))
+            if is_graph and lazy:
+                result = read_graph_columns_lazy(filename)
+            elif is_graph:
+                result = read_graph_columns(filename)
             else:
                 result = pickle.load(open(filename, "rb"))
         except Exception as e:
@@ -175,8 +430,82 @@ def read_and_or_write(filename, action, use_storage=True, is_graph=True, overwri
     if (not file_exists) or overwrite or (is_old and overwrite_if_old):
         logger(f"(Over)writing {filename}")
         if is_graph:
-            pickle.dump(graph_to_pickle(result), open(filename, "wb"))
+            write_graph_columns(result, filename)
+            # Continue on the memory-mapped graph to not hold on to the computed graph.
+            if lazy:
+                result = read_graph_columns_lazy(filename)
         else:
             pickle.dump(result, open(filename, "wb"))
 
     return result
+
+
+### Content-addressed cache of prepared graphs.
+
+# Folder the prepared graphs (and their node R-Trees) are cached in.
+prepared_cache_folder = "data/prepared"
+
+# Version of the graph preparation, part of the cache key.
+# * Bump whenever the semantics of preparing a graph change (`prepare_graph_for_apls`, `prepare_graph_for_topo` and what they call, e.g. simplification or curve cutting),
+#   otherwise graphs prepared by the old code are served from the cache.
+prepared_graph_version = 2
+
+
+# Compute a stable hash on graph contents (node positions, edges with their curvature) and the preparation parameters.
+def graph_content_hash(G, **parameters):
+
+    digest = hashlib.sha256()
+
+    # Graph type and preparation parameters.
+    digest.update(json.dumps({"simplified": G.graph["simplified"], "coordinates": G.graph["coordinates"]}, sort_keys=True).encode())
+    digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+
+    # Node positions (ordered by nid).
+    for nid, attrs in sorted(iterate_nodes(G), key=lambda item: item[0]):
+        digest.update(array([nid, attrs["y"], attrs["x"]], dtype=np.float64).tobytes())
+
+    # Edges with curvature (ordered by eid).
+    # * An edge without curvature only hashes its eid: It is the straight line between its (hashed) endpoints.
+    # * Other node and edge attributes are not hashed.
+    for eid, attrs in sorted(iterate_edges(G), key=lambda item: item[0]):
+        digest.update(array(eid, dtype=np.float64).tobytes())
+        if "curvature" in attrs:
+            digest.update(np.ascontiguousarray(attrs["curvature"], dtype=np.float64).tobytes())
+
+    return digest.hexdigest()
+
+
+# Obtain prepared graph from the cache, or prepare it (by calling `action`) and store it in the cache.
+# * The cache key is the content hash of the (unprepared) graph together with the preparation parameters and `prepared_graph_version`.
+# * The cache filename is stored under `G.graph["cache"]` of the result, so related data (node R-Tree) is cached alongside.
+@info()
+def read_or_prepare_graph(G, action, folder=prepared_cache_folder, **parameters):
+
+    Path(folder).mkdir(parents=True, exist_ok=True)
+
+    filename = f"{folder}/{graph_content_hash(G, version=prepared_graph_version, **parameters)}"
+    result = read_and_or_write(filename, action)
+    result.graph["cache"] = filename
+
+    return result
+
+
+# Construct R-Tree on graph nodes, persisted alongside the graph if it originates from the prepared graph cache.
+def graphnodes_to_cached_rtree(G):
+
+    if "cache" not in G.graph or len(G.nodes()) == 0:
+        return graphnodes_to_rtree(G)
+
+    filename = G.graph["cache"] + "-nodes"
+
+    # Reuse the R-Tree on disk (if it matches the graph).
+    if os.path.exists(filename + ".idx"):
+        tree = rtree.index.Index(filename)
+        if len(tree) == len(G.nodes()):
+            return tree
+        logger(f"Cached node R-Tree at {filename} does not match the graph. Constructing in memory.")
+        return graphnodes_to_rtree(G)
+
+    # Bulk load the R-Tree to disk.
+    nids, positions = graphnodes_to_arrays(G)
+    return rtree.index.Index(filename, (nids, positions, positions))
@@ -10,6 +10,8 @@ import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 from matplotlib.widgets import CheckButtons
 from scipy import stats
+from scipy.sparse import csr_matrix, csgraph
+from scipy.spatial import cKDTree
 import PIL as pil
 import seaborn as sns
 # Geometry
@@ -21,18 +23,24 @@ from partial_curve_matching import Vector, partial_curve_graph, make_graph # (Sh
 from pathlib import Path
 from fileinput import input
 import json
+import hashlib
 import pickle
 import os
+import zipfile
+import struct
 # Standard library
 import math
 import itertools
 import random
 import subprocess
+import multiprocessing
 # Utils
 from operator import itemgetter
 import traceback
 from time import time
 from copy import deepcopy
+import weakref
+from contextlib import contextmanager
 from enum import Enum
 
 # Shortcuts
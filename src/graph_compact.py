@@ -0,0 +1,252 @@
+from external import *
+from utilities import *
+
+
+# Compact (array-backed) immutable road graph for metric computation.
+# * Nodes: Node identifiers `nids` and their positions `positions` (`(y, x)` per node), node index `i` refers to node `nids[i]`.
+# * Edges: Node indices `us`, `vs` (with `nids[u] <= nids[v]`, as `iterate_edges` orients edges), keys `ks` (zero for vectorized graphs) and `lengths`.
+# * Curvature: A single flat buffer, edge `e` has curvature `curvature[offsets[e]:offsets[e+1]]` (as stored on the networkx graph, thus running from `u` to `v` or from `v` to `u`).
+# * Adjacency: CSR, the neighbors of node index `i` are `indices[indptr[i]:indptr[i+1]]`, connected by edge indices `edges[indptr[i]:indptr[i+1]]`.
+# * Only the graph attributes ("simplified", "coordinates", ...) are kept, other node and edge attributes are dropped.
+# Arrays are read-only, the graph is never mutated: Convert into networkx (`compact_to_graph`) to adjust it.
+class CompactGraph:
+
+    def __init__(self, nids, positions, us, vs, ks, lengths, curvature, offsets, graph):
+
+        self.graph     = dict(graph)
+        self.nids      = np.ascontiguousarray(nids, dtype=np.int64)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.us        = np.ascontiguousarray(us, dtype=np.int64)
+        self.vs        = np.ascontiguousarray(vs, dtype=np.int64)
+        self.ks        = np.ascontiguousarray(ks, dtype=np.int64)
+        self.lengths   = np.ascontiguousarray(lengths, dtype=np.float64)
+        self.curvature = np.ascontiguousarray(curvature, dtype=np.float64).reshape(-1, 2)
+        self.offsets   = np.ascontiguousarray(offsets, dtype=np.int64)
+
+        # Node identifier lookup (by binary search on the sorted identifiers).
+        self.sorter = np.argsort(self.nids, kind="stable")
+
+        # CSR adjacency (both directions, a self-loop is listed once).
+        edges = np.arange(len(self.us))
+        loops = self.us == self.vs
+        rows  = np.concatenate((self.us, self.vs[~loops]))
+        cols  = np.concatenate((self.vs, self.us[~loops]))
+        edges = np.concatenate((edges, edges[~loops]))
+        order = np.argsort(rows, kind="stable")
+        self.indptr  = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(self.nids))))).astype(np.int64)
+        self.indices = cols[order]
+        self.edges   = edges[order]
+
+        for value in [self.nids, self.positions, self.us, self.vs, self.ks, self.lengths, self.curvature, self.offsets, self.sorter, self.indptr, self.indices, self.edges]:
+            value.flags.writeable = False
+
+        self.matrix = None # (Weighted adjacency matrix, constructed on first use.)
+
+    def __len__(self):
+        return len(self.nids)
+
+    def __repr__(self):
+        return f"CompactGraph(nodes={len(self.nids)}, edges={len(self.us)}, graph={self.graph})"
+
+    # Number of nodes and edges.
+    def node_count(self):
+        return len(self.nids)
+
+    def edge_count(self):
+        return len(self.us)
+
+    # Node identifiers (in node index order).
+    def nodes(self):
+        return self.nids.tolist()
+
+    # Edge identifiers (in edge index order), formatted as `iterate_edges` does.
+    def eids(self):
+        if self.graph["simplified"]:
+            return list(zip(self.nids[self.us].tolist(), self.nids[self.vs].tolist(), self.ks.tolist()))
+        return list(zip(self.nids[self.us].tolist(), self.nids[self.vs].tolist()))
+
+    # Node indices of node identifiers.
+    def node_indices(self, nids):
+        nids = np.asarray(nids, dtype=np.int64)
+        if len(self.nids) == 0 and len(nids) > 0:
+            raise Exception("Expect all node identifiers to exist in the graph.")
+        indices = self.sorter[np.searchsorted(self.nids, nids, sorter=self.sorter).clip(0, max(len(self.nids) - 1, 0))]
+        if len(nids) > 0 and not np.all(self.nids[indices] == nids):
+            raise Exception("Expect all node identifiers to exist in the graph.")
+        return indices
+
+    # Curvature of edge index `e`.
+    def edge_curvature(self, e):
+        return self.curvature[self.offsets[e]:self.offsets[e + 1]]
+
+    # Neighbor node indices and connecting edge indices of node index `i`.
+    def neighbors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]], self.edges[self.indptr[i]:self.indptr[i + 1]]
+
+    # Weighted (symmetric) adjacency matrix on node indices (see `graph_to_csr_matrix`).
+    # * Self-loops are dropped, only the lowest edge length is retained between a pair of nodes.
+    def csr_matrix(self):
+
+        if self.matrix is not None:
+            return self.matrix
+
+        n = len(self.nids)
+        loops = self.us == self.vs
+        rows, cols = np.concatenate((self.us[~loops], self.vs[~loops])), np.concatenate((self.vs[~loops], self.us[~loops]))
+        weights = np.concatenate((self.lengths[~loops], self.lengths[~loops]))
+
+        # Only retain lowest weight per `(row, col)` pair (the CSR constructor would sum duplicated entries).
+        order = np.lexsort((weights, cols, rows))
+        rows, cols, weights = rows[order], cols[order], weights[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+
+        self.matrix = csr_matrix((weights[first], (rows[first], cols[first])), shape=(n, n))
+
+        return self.matrix
+
+    # Line-segments of all edge curvatures, with every interior curvature point as a node (the vectorized graph).
+    # * `p`, `q`: Start and endpoint of every line-segment, `edge`: Edge index the line-segment belongs to.
+    # * `a`, `b`: Node identifiers of the line-segment endpoints, interior curvature points get identifiers beyond the highest node identifier.
+    def linesegments(self):
+
+        counts = np.diff(self.offsets) - 1 # Line-segments per edge.
+        edge   = np.repeat(np.arange(len(self.us)), counts)
+
+        # Curvature point index every line-segment starts at (skipping the segments between consecutive curves).
+        valid = np.ones(max(len(self.curvature) - 1, 0), dtype=bool)
+        valid[self.offsets[1:-1] - 1] = False
+        starts = np.flatnonzero(valid)
+
+        # Node identifier per curvature point (endpoints are the edge nodes, interior points are numbered incrementally).
+        point_nids = np.zeros(len(self.curvature), dtype=np.int64)
+        interior = np.ones(len(self.curvature), dtype=bool)
+        interior[self.offsets[:-1]] = False
+        interior[self.offsets[1:] - 1] = False
+        point_nids[interior] = (self.nids.max() + 1 if len(self.nids) > 0 else 0) + np.arange(np.count_nonzero(interior))
+        # Curvature may run from `v` to `u`: Its first point is nearest to the node it starts at (not necessarily equal, e.g. by rounding).
+        firsts  = self.curvature[self.offsets[:-1]]
+        forward = norm(firsts - self.positions[self.us], axis=1) <= norm(firsts - self.positions[self.vs], axis=1)
+        point_nids[self.offsets[:-1]] = np.where(forward, self.nids[self.us], self.nids[self.vs])
+        point_nids[self.offsets[1:] - 1] = np.where(forward, self.nids[self.vs], self.nids[self.us])
+
+        return {
+            "edge": edge,
+            "p"   : self.curvature[starts],
+            "q"   : self.curvature[starts + 1],
+            "a"   : point_nids[starts],
+            "b"   : point_nids[starts + 1],
+        }
+
+
+# Extract the data to construct a rust graph with out of a selection of line-segments (see `CompactGraph.linesegments` and `graph_to_rust_graph_data`).
+def linesegments_to_rust_graph_data(segments, indices):
+
+    indices = np.asarray(indices, dtype=np.int64)
+    a, b = segments["a"][indices].tolist(), segments["b"][indices].tolist()
+
+    # Extract vertices as `[(nid, (y, x))]`.
+    vertices = dict(zip(a, map(tuple, segments["p"][indices].tolist())))
+    vertices.update(zip(b, map(tuple, segments["q"][indices].tolist())))
+    # Extract edges as `[(nid, nid)]`.
+    eids = [(min(u, v), max(u, v)) for u, v in zip(a, b)]
+
+    return list(vertices.items()), eids
+
+
+# Convert a networkx graph into a compact graph.
+# * Edge lengths are taken from the "length" attribute (if every edge has it), otherwise derived from curvature.
+def graph_to_compact(G):
+
+    if type(G) == CompactGraph:
+        return G
+
+    nids, positions = graphnodes_to_arrays(G)
+    sorter = np.argsort(nids, kind="stable")
+
+    eids, curves, lengths = [], [], []
+    for eid, attrs in iterate_edges(G):
+        eids.append(eid)
+        curve = attrs["curvature"] if "curvature" in attrs else array([graphnode_position(G, eid[0]), graphnode_position(G, eid[1])])
+        curves.append(np.asarray(curve, dtype=np.float64).reshape(-1, 2))
+        lengths.append(attrs.get("length", None))
+
+    offsets = np.concatenate(([0], np.cumsum([len(ps) for ps in curves], dtype=np.int64)))
+    curvature = np.concatenate(curves) if len(curves) > 0 else np.zeros((0, 2))
+
+    # Edge lengths (summing segment lengths per curve, segments between consecutive curves are ignored).
+    if len(eids) == 0 or None in lengths:
+        segment_lengths = np.zeros(len(curvature))
+        segment_lengths[:-1] = norm(curvature[1:] - curvature[:-1], axis=1)
+        segment_lengths[offsets[1:] - 1] = 0
+        lengths = np.add.reduceat(segment_lengths, offsets[:-1]) if len(eids) > 0 else np.zeros(0)
+
+    endpoints = array([eid[:2] for eid in eids], dtype=np.int64).reshape(-1, 2)
+    us = sorter[np.searchsorted(nids, endpoints[:,0], sorter=sorter)]
+    vs = sorter[np.searchsorted(nids, endpoints[:,1], sorter=sorter)]
+    ks = array([eid[2] if len(eid) == 3 else 0 for eid in eids], dtype=np.int64)
+
+    graph = {key: G.graph[key] for key in G.graph if key not in ["cache"]}
+
+    return CompactGraph(nids, positions, us, vs, ks, lengths, curvature, offsets, graph)
+
+
+# Convert a compact graph into a networkx graph (a multigraph if simplified) with curvature and length annotated on edges.
+# * Edge curvatures are (writable) slices of a single copy of the curvature buffer.
+def compact_to_graph(C):
+
+    G = nx.MultiGraph() if C.graph["simplified"] else nx.Graph()
+    G.graph.update(C.graph)
+
+    G.add_nodes_from((nid, {"y": y, "x": x}) for nid, (y, x) in zip(C.nids.tolist(), C.positions.tolist()))
+
+    curvature = C.curvature.copy()
+    us, vs, lengths, offsets = C.nids[C.us].tolist(), C.nids[C.vs].tolist(), C.lengths.tolist(), C.offsets.tolist()
+    attributes = ({"curvature": curvature[offsets[e]:offsets[e + 1]], "length": lengths[e]} for e in range(len(us)))
+    if C.graph["simplified"]:
+        G.add_edges_from((u, v, k, attrs) for u, v, k, attrs in zip(us, vs, C.ks.tolist(), attributes))
+    else:
+        G.add_edges_from((u, v, attrs) for u, v, attrs in zip(us, vs, attributes))
+
+    return G
+
+
+# Obtain the networkx graph of a (possibly) compact graph.
+def compact_as_networkx_graph(G):
+    return compact_to_graph(G) if type(G) == CompactGraph else G
+
+
+# Test compact graph conversion (round-trip with networkx, weighted adjacency matrix and line-segments).
+def test_compact_graph():
+
+    G = nx.MultiGraph()
+    G.graph.update({"simplified": True, "coordinates": "utm"})
+    G.add_nodes_from([(1, {"y": 0., "x": 0.}), (2, {"y": 0., "x": 10.}), (4, {"y": 10., "x": 10.})])
+    G.add_edge(1, 2, curvature=array([(0., 0.), (0., 10.)]), length=10.)
+    G.add_edge(1, 2, curvature=array([(0., 10.), (5., 5.), (0., 0.)]), length=2 * sqrt(50)) # (Runs from `v` to `u`.)
+    G.add_edge(2, 4, curvature=array([(0., 10. + 1e-9), (5., 12.), (10., 10.)]), length=2 * sqrt(29)) # (Starts at `u` up to a rounding error.)
+    G.add_edge(4, 4, curvature=array([(10., 10.), (12., 12.), (10., 12.), (10., 10.)]), length=4 + 2 * sqrt(8))
+
+    C = graph_to_compact(G)
+    H = compact_to_graph(C)
+
+    # Round-trip.
+    assert sorted(G.nodes()) == sorted(H.nodes())
+    assert sorted(iterate_nodes(G)) == sorted(iterate_nodes(H))
+    for eid, attrs in iterate_edges(G):
+        assert np.all(get_edge_attributes(H, eid)["curvature"] == attrs["curvature"])
+        assert get_edge_attributes(H, eid)["length"] == attrs["length"]
+
+    # Weighted adjacency matrix.
+    matrix, nids = graph_to_csr_matrix(G)
+    assert nids == C.nodes()
+    assert abs(matrix - C.csr_matrix()).max() < 0.0001
+
+    # Line-segments connect to the node the curvature starts or ends at.
+    segments = C.linesegments()
+    positions = dict(zip(C.nodes(), C.positions))
+    for p, q, a, b in zip(segments["p"], segments["q"], segments["a"].tolist(), segments["b"].tolist()):
+        assert a not in positions or norm(p - positions[a]) < 0.0001
+        assert b not in positions or norm(q - positions[b]) < 0.0001
+    assert len(segments["edge"]) == sum(len(attrs["curvature"]) - 1 for _, attrs in iterate_edges(G))
+    assert C.node_indices([4]).tolist() == [2]
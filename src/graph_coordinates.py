@@ -43,39 +43,50 @@ def transform_geographic_coordinates_into_scaled_pixel_positioning(G, reflat):
     
 
 # Abstract function with core logic for utm/latlon graph conversion.
-def graph_transform_generic(G, coordinate_transformer):
+# * The `coordinates_transformer` converts arrays of y and x coordinates at once.
+# * All node positions and curvature points are gathered into a single array, transformed, and scattered back.
+# * With `inplace` the graph itself is transformed (see `graph_to_transform`).
+def graph_transform_generic(G, coordinates_transformer, inplace=False):
 
-    G = G.copy()
+    G = graph_to_transform(G, inplace=inplace)
 
-    node_relabel_mapping = {}
-    edge_relabel_mapping = {}
+    nodes = list(iterate_nodes(G))
+    edges = list(iterate_edges(G))
+
+    # Gather node positions followed by all curvature points.
+    curvatures = [attrs["curvature"] for _, attrs in edges]
+    offsets = np.concatenate(([0], np.cumsum([len(ps) for ps in curvatures], dtype=np.int64))) + len(nodes)
+    ps = np.concatenate([array([[attrs["y"], attrs["x"]] for _, attrs in nodes]).reshape(-1, 2)] + [np.asarray(ps).reshape(-1, 2) for ps in curvatures])
+
+    # Convert coordinates.
+    ys, xs = coordinates_transformer(ps[:,0], ps[:,1])
+    ps = np.column_stack((ys, xs))
 
     # Adjust coordinates of graph nodes.
-    for nid, attrs in G.nodes(data=True):
-        y, x = attrs["y"], attrs["x"]
-        y, x = coordinate_transformer(y, x)
-        node_relabel_mapping[nid] = {**attrs, "y": y, "x": x}
-    
-    nx.set_node_attributes(G, node_relabel_mapping)
-    
-    # Update edge curvature.
-    for eid, attrs in iterate_edges(G):
+    for (nid, attrs), (y, x) in zip(nodes, ps[:len(nodes)].tolist()):
+        attrs["y"] = y
+        attrs["x"] = x
 
-        curvature = attrs["curvature"]
-        curvature = array([coordinate_transformer(y, x) for y, x in curvature])
-        geometry  = to_linestring(curvature)
-        edge_length = curve_length(curvature)
+    # Edge lengths (summing segment lengths per curve, segments between consecutive curves are ignored).
+    segment_lengths = np.zeros(len(ps))
+    segment_lengths[:-1] = np.linalg.norm(ps[1:] - ps[:-1], axis=1)
+    segment_lengths[offsets[1:] - 1] = 0
+    edge_lengths = np.add.reduceat(segment_lengths, offsets[:-1]) if len(edges) > 0 else []
 
-        edge_relabel_mapping[eid] = {**attrs, "geometry": geometry, "curvature": curvature, "length": edge_length}
+    # Update edge curvature (cached geometry is derived again on access).
+    for i, (eid, attrs) in enumerate(edges):
+        attrs["curvature"] = ps[offsets[i]:offsets[i + 1]]
+        attrs["length"] = float(edge_lengths[i])
 
-    nx.set_edge_attributes(G, edge_relabel_mapping)
+    # Node positions moved, so a spatial index on the graph is outdated.
+    drop_spatial_index(G)
 
     return G
 
 
 # Transform graphnodes UTM coordinate system into latitude-longitude coordinates.
 @info()
-def graph_transform_utm_to_latlon(G, place, letter=None, number=None):
+def graph_transform_utm_to_latlon(G, place, letter=None, number=None, inplace=False):
 
     assert G.graph["coordinates"] == "utm"
 
@@ -85,8 +96,8 @@ def graph_transform_utm_to_latlon(G, place, letter=None, number=None):
     utm_info = {"number": number, "letter": letter}
 
     # Convert coordinates.
-    coordinate_transformer = lambda y, x: utm_to_latlon_by_utm_info((y, x), **utm_info)
-    G = graph_transform_generic(G, coordinate_transformer)
+    coordinates_transformer = lambda ys, xs: utms_to_latlons_by_utm_info(ys, xs, **utm_info)
+    G = graph_transform_generic(G, coordinates_transformer, inplace=inplace)
 
     G.graph["coordinates"] = "latlon"
 
@@ -95,12 +106,12 @@ def graph_transform_utm_to_latlon(G, place, letter=None, number=None):
 
 # Transform graphnodes latitude-longitude coordinates into UTM coordinate system.
 @info()
-def graph_transform_latlon_to_utm(G):
+def graph_transform_latlon_to_utm(G, inplace=False):
 
     assert G.graph["coordinates"] == "latlon"
 
-    coordinate_transformer = lambda y, x: latlon_to_utm((y, x))
-    G = graph_transform_generic(G, coordinate_transformer)
+    coordinates_transformer = lambda ys, xs: latlons_to_utms(ys, xs)
+    G = graph_transform_generic(G, coordinates_transformer, inplace=inplace)
 
     G.graph["coordinates"] = "utm"
 
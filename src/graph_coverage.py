@@ -2,6 +2,7 @@ from external import *
 from utilities import *
 from network import *
 from graph_coordinates import *
+from graph_compact import *
 
 ###  Curve by curve coverage
 
@@ -24,7 +25,7 @@ def curve_by_curveset_coverage(ps, qss, lam):
 def edges_covered_by_nid(G, nid, threshold):
 
     # Find nearby edges.
-    edge_tree = graphedges_to_rtree(G)
+    edge_tree = graph_edge_rtree(G)
     node_bbox = graphnode_to_bbox(G, nid, padding=threshold)
     nearby_eids = intersect_rtree_bbox(edge_tree, node_bbox)
 
@@ -42,11 +43,86 @@ def edges_covered_by_nid(G, nid, threshold):
 
 ###  Curve by network coverage
 
+# Seek the lowest threshold (a multiple of `resolution`, at most `max_threshold`) at which a curve is covered by a (rust) graph.
+# * Coverage is monotone in the threshold, so we search exponentially and then bisect: O(log max_threshold) partial curve matching calls.
+# * With `search="linear"` we increment the threshold step by step instead.
+# * Returns the threshold alongside the path (node identifiers) covering the curve, or `(inf, None)` if the curve is not covered.
+def curve_by_graph_threshold(graph, curve, max_threshold, resolution=1, search="bisect"):
+
+    if search not in ["bisect", "linear"]:
+        raise Exception(f"Expect threshold search to be either 'bisect' or 'linear', got '{search}'.")
+
+    max_step = floor(max_threshold / resolution)
+
+    if search == "linear":
+        for step in range(1, max_step + 1):
+            path = partial_curve_graph(graph, curve, step * resolution)
+            if path != None:
+                return step * resolution, path
+        return inf, None
+
+    lower = 0    # Highest step known to not cover the curve.
+    upper = None # Lowest step known to cover the curve.
+    path  = None # Path found at the upper step.
+
+    # Exponential search for an upper step which covers the curve.
+    step = 1
+    while step <= max_step:
+        found = partial_curve_graph(graph, curve, step * resolution)
+        if found != None:
+            upper, path = step, found
+            break
+        lower = step
+        if step == max_step:
+            break
+        step = min(2 * step, max_step)
+
+    # Not covered within the maximal threshold.
+    if upper == None:
+        return inf, None
+
+    # Bisect between the uncovered and covered step.
+    while upper - lower > 1:
+        step = (lower + upper) // 2
+        found = partial_curve_graph(graph, curve, step * resolution)
+        if found != None:
+            upper, path = step, found
+        else:
+            lower = step
+
+    return upper * resolution, path
+
+
+# Seek the coverage threshold of a shard of edges (executed by a worker process of `edge_graph_coverage`).
+# * Every job consists of an edge identifier, its curvature and the data to construct its nearby subgraph (as rust graph) with.
+def edge_graph_coverage_shard(jobs, max_threshold, search, resolution):
+    results = []
+    for eid, ps, subgraph_data in jobs:
+        subgraph = rust_graph_data_to_rust_graph(subgraph_data)
+        threshold, path = curve_by_graph_threshold(subgraph, curve_to_vector_list(ps), max_threshold, resolution=resolution, search=search)
+        results.append((eid, threshold, path))
+    return results
+
+
 # Obtain threshold per simplified edge of S in comparison to T.
+# * With `search="bisect"` every edge seeks its lowest threshold separately (see `curve_by_graph_threshold`).
+# * With `search="linear"` all edges are checked at every increment of the threshold.
+# * Use `resolution` (in meters) to seek thresholds at sub-meter precision.
+# * Use `workers` to distribute the edges of S over a process pool (results are identical to running on a single process).
+# * With `inplace` the thresholds are annotated on S itself (see `graph_to_transform`), T is never mutated.
+# * T can be a compact graph (see `CompactGraph`), its subgraphs are then taken directly from its curvature line-segments.
 @info()
-def edge_graph_coverage(S, T, max_threshold=None): 
+def edge_graph_coverage(S, T, max_threshold=None, search="bisect", resolution=1, workers=1, inplace=False): 
+
+    # Validate arguments (regardless of the validation level).
+    if search not in ["bisect", "linear"]:
+        raise Exception(f"Expect threshold search to be either 'bisect' or 'linear', got '{search}'.")
+    if max_threshold == None and (search == "bisect" or workers > 1):
+        raise Exception("Expect a maximal threshold to bound the threshold search per edge.")
+    if type(T) == CompactGraph and T.graph["coordinates"] != "utm":
+        raise Exception("Expect a compact target graph to be in UTM coordinates.")
 
-    S = S.copy()
+    S = graph_to_transform(S, inplace=inplace)
 
     # Sanity check the graph is simplified.
     check(S.graph["simplified"], expect="Expect the source graph is simplified" \
@@ -55,28 +131,42 @@ def edge_graph_coverage(S, T, max_threshold=None):
 
     # Sanity checks each edge has a threshold set..
     check("threshold" not in S.graph, expect="Expect the graph to not have a 'max_threshold' attribute set.")
-    for _, attrs in iterate_edges(S):
-        check("threshold" not in attrs, expect="Expect edge in source to not have the 'threshold' attribute set" \
-                                               ", because such existence suggests we are overwriting a previous coverage check" \
-                                               ", suggesting some coverage computation is accidentally out of place.")
+    if validate("full"):
+        for _, attrs in iterate_edges(S):
+            check("threshold" not in attrs, expect="Expect edge in source to not have the 'threshold' attribute set" \
+                                                   ", because such existence suggests we are overwriting a previous coverage check" \
+                                                   ", suggesting some coverage computation is accidentally out of place.")
 
     # Make sure both source and target are in UTM coordinates (for threshold to make sense).
     convert_to_utm = S.graph["coordinates"] != "utm"
 
     if S.graph["coordinates"] != "utm":
         utm_info = graph_utm_info(S)
-        S = graph_transform_latlon_to_utm(S)
-    if T.graph["coordinates"] != "utm":
-        T = graph_transform_latlon_to_utm(T)
+        S = graph_transform_latlon_to_utm(S, inplace=True)
 
     # We allow target to be vectorized, it causes no loss of information (since target is not being adjusted).
     was_simplified = T.graph["simplified"]
-    if T.graph["simplified"]:
-        T = vectorize_graph(T)
+    compact = type(T) == CompactGraph
+    if compact:
+
+        # The line-segments of the curvature form the vectorized graph, link them to the edge they originate from.
+        segments = T.linesegments()
+        T_eids = T.eids()
+        vectorized_from = {}
+        for a, b, e in zip(segments["a"].tolist(), segments["b"].tolist(), segments["edge"].tolist()):
+            vectorized_from[(a, b)] = vectorized_from[(b, a)] = T_eids[e]
+
+    else:
+
+        owns_T = T.graph["coordinates"] != "utm"
+        if T.graph["coordinates"] != "utm":
+            T = graph_transform_latlon_to_utm(T)
+
+        if T.graph["simplified"]:
+            T = vectorize_graph(T, inplace=owns_T)
 
     # Threshold computation iteration variables.
     leftS  = set([eid for eid, _ in iterate_edges(S)]) # Edges we seek a threshold value for.
-    lam    = 1 # Start with a threshold of 1 meter.
     thresholds = {} # Currently found thresholds.
     covered_by = {} # Track (collection of) edges of T which covers the edge of S.
     
@@ -88,9 +178,12 @@ def edge_graph_coverage(S, T, max_threshold=None):
         curves[eid] = curve
     
     ## Performance: Construct graph per edge (subgraph with nodes in `threshold` meter radius to edge curvature).
-    graph_annotate_edge_curvature(T)
     graph_annotate_edge_curvature(S)
-    edge_tree = graphedges_to_rtree(T)
+    if compact:
+        edge_tree = linesegments_to_rtree(segments["p"], segments["q"])
+    else:
+        graph_annotate_edge_curvature(T)
+        edge_tree = graphedges_to_rtree(T)
     edge_bboxs = graphedges_to_bboxs(S, padding=max_threshold)
     subgraphs = {}
     # Per simplified edge of S, construct a subgraph of nearby edges of T.
@@ -99,47 +192,88 @@ def edge_graph_coverage(S, T, max_threshold=None):
         # Obtain nearby node identifiers.
         nearby_eids = intersect_rtree_bbox(edge_tree, edge_bboxs[eid])
 
-        # Extract subgraph.
-        subgraph = T.edge_subgraph(nearby_eids)
+        # Extract subgraph and convert it into data to construct a rust graph with.
+        if compact:
+            subgraph = linesegments_to_rust_graph_data(segments, nearby_eids)
+        else:
+            subgraph = graph_to_rust_graph_data(T.edge_subgraph(nearby_eids))
 
-        # Convert the subgraph a rust graph.
-        subgraph = graph_to_rust_graph(subgraph)
+        # Convert into a rust graph (Workers construct the rust graph themselves).
+        if workers == 1:
+            subgraph = rust_graph_data_to_rust_graph(subgraph)
         
         # Store.
         subgraphs[eid] = subgraph
     
     # Sanity check subgraphs make sense.
-    node_tree = graphnodes_to_rtree(S)
-    edge_bboxs = graphedges_to_bboxs(S, padding=1)
-    for eid in leftS:
-        nearby_nids = intersect_rtree_bbox(node_tree, edge_bboxs[eid])
-        eids = set(flatten([get_connected_eids(S, nid) for nid in nearby_nids]))
-        check(eid in eids, expect="Expect the eid to be present within the set: The edges adjacent to nodes captured by the edgebbox of eid.")
+    if validate("full"):
+        node_tree = graphnodes_to_rtree(S)
+        edge_bboxs = graphedges_to_bboxs(S, padding=1)
+        for eid in leftS:
+            nearby_nids = intersect_rtree_bbox(node_tree, edge_bboxs[eid])
+            eids = set(flatten([get_connected_eids(S, nid) for nid in nearby_nids]))
+            check(eid in eids, expect="Expect the eid to be present within the set: The edges adjacent to nodes captured by the edgebbox of eid.")
 
-    # Increment threshold and seek nearby path till all edges have found a threshold (or max threshold is reached).
-    logger("Seek path for threshold.")
-    while len(leftS) > 0 and (max_threshold == None or lam <= max_threshold):
-        logger(f"Lambda: {lam}. Edges: {len(leftS)}")
+    if workers > 1:
 
-        for eid in leftS:
-            curve = curves[eid]
-            subgraph = subgraphs[eid]
-            path = partial_curve_graph(subgraph, curve, lam)
+        # Shard the edges (in a fixed order) over the workers.
+        eids   = sorted(leftS)
+        shards = [eids[i::workers] for i in range(workers)]
+        shards = [[(eid, get_edge_attributes(S, eid)["curvature"], subgraphs[eid]) for eid in shard] for shard in shards if len(shard) > 0]
 
-            # Annotate threshold to edge if applicable.
+        logger(f"Seek path for threshold per edge on {len(shards)} workers.")
+        with multiprocessing.Pool(len(shards)) as pool:
+            results = pool.starmap(edge_graph_coverage_shard, [(shard, max_threshold, search, resolution) for shard in shards])
+
+        # Merge thresholds and covering paths.
+        for eid, threshold, path in flatten(results):
             if path != None:
+                leftS.remove(eid)
+                thresholds[eid] = threshold
+                covered_by[eid] = list(zip(path[:-1], path[1:])) # (See note on path in linear search.)
+
+    elif search == "bisect":
 
-                # Remove edge from edge set.
-                leftS = leftS - set([eid]) 
-                # Save threshold to apply later.
-                thresholds[eid] = lam
-                # Store the path (edge identifiers) which curvature is used to cover this edge of S.
-                # NOTE: Path is a sequence of node identifiers traversed. This represents thereby as well the traversed edges (and thus the curvature).
-                #       These eids are always `(u, v)` because T is vectorized at this point.
-                #       If T was originally a simplified graph, we will reconstruct the simplified edges involved at the end of this function
-                covered_by[eid] = list(zip(path[:-1], path[1:]))
+        # Seek lowest threshold per edge.
+        logger("Seek path for threshold per edge.")
+        for eid in list(leftS):
+            threshold, path = curve_by_graph_threshold(subgraphs[eid], curves[eid], max_threshold, resolution=resolution)
 
-        lam += 1 # Increment lambda.
+            # Annotate threshold to edge if applicable.
+            if path != None:
+                leftS.remove(eid)
+                thresholds[eid] = threshold
+                covered_by[eid] = list(zip(path[:-1], path[1:])) # (See note on path in linear search.)
+
+    else:
+
+        # Increment threshold and seek nearby path till all edges have found a threshold (or max threshold is reached).
+        logger("Seek path for threshold.")
+        step = 1
+        lam  = resolution
+        while len(leftS) > 0 and (max_threshold == None or lam <= max_threshold):
+            logger(f"Lambda: {lam}. Edges: {len(leftS)}")
+
+            for eid in list(leftS):
+                curve = curves[eid]
+                subgraph = subgraphs[eid]
+                path = partial_curve_graph(subgraph, curve, lam)
+
+                # Annotate threshold to edge if applicable.
+                if path != None:
+
+                    # Remove edge from edge set.
+                    leftS.remove(eid)
+                    # Save threshold to apply later.
+                    thresholds[eid] = lam
+                    # Store the path (edge identifiers) which curvature is used to cover this edge of S.
+                    # NOTE: Path is a sequence of node identifiers traversed. This represents thereby as well the traversed edges (and thus the curvature).
+                    #       These eids are always `(u, v)` because T is vectorized at this point.
+                    #       If T was originally a simplified graph, we will reconstruct the simplified edges involved at the end of this function
+                    covered_by[eid] = list(zip(path[:-1], path[1:]))
+
+            step += 1 # Increment lambda.
+            lam = step * resolution
 
     # Set unprocessed edges to have infinite threshold and no coverage edge identifiers.
     logger("Set unprocessed edges to have infinite threshold and no coverage edge identifiers.")
@@ -159,7 +293,7 @@ def edge_graph_coverage(S, T, max_threshold=None):
 
             for T_eid in covered_by[S_eid]: # We extract simplified edges from all vectorized edges that participated.
 
-                related_simplified_edge = get_edge_attributes(T, T_eid)["vectorized_from"]
+                related_simplified_edge = vectorized_from[T_eid] if compact else get_edge_attributes(T, T_eid)["vectorized_from"]
                 new_covered_by[S_eid] = new_covered_by[S_eid].union(set([related_simplified_edge]))
         
         covered_by = new_covered_by
@@ -169,7 +303,7 @@ def edge_graph_coverage(S, T, max_threshold=None):
 
     # Restore graph to input state.
     if convert_to_utm:
-        S = graph_transform_utm_to_latlon(S, "", **utm_info) # Convert back into latlon.
+        S = graph_transform_utm_to_latlon(S, "", **utm_info, inplace=True) # Convert back into latlon.
 
     # Apply threshold annotation.
     S.graph['max_threshold'] = max_threshold # Mention till what threshold we have searched.
@@ -27,17 +27,12 @@ def graph_annotate_edge_length(G):
 
 
 # Add geometry attribute to every edge.
+# * Geometry is otherwise derived lazily from curvature on access (see `attributes_geometry`).
 @info()
 def graph_annotate_edge_geometry(G):
 
-    edge_attrs = {}
     for eid, attrs in iterate_edges(G):
-
-        ps = attrs["curvature"]
-        geometry = to_linestring(ps)
-        edge_attrs[eid] = {**attrs, "geometry": geometry}
-    
-    nx.set_edge_attributes(G, edge_attrs)
+        attributes_geometry(attrs)
 
 
 # Annotate each edge with curvature (if not already the case).
@@ -68,13 +63,17 @@ def graph_annotate_edge_curvature(G):
 
             attrs["curvature"] = ps
 
+    # Edges without curvature got it derived (possibly deviating from what a cached spatial index placed them by).
+    drop_spatial_index(G)
+
     # Sanity check all curves got annotated.
-    for eid, attrs in iterate_edges(G):
-        check("curvature" in attrs)
-        check(type(attrs["curvature"]) == type(array([])))
+    if validate("full"):
+        for eid, attrs in iterate_edges(G):
+            check("curvature" in attrs)
+            check(type(attrs["curvature"]) == type(array([])))
 
 
-# Annotate edge with basic attribute information (curvature, geometry and length).
+# Annotate edge with basic attribute information (curvature and length, geometry is derived on access).
 def graph_annotate_edge(G, eid):
     
     attrs = get_edge_attributes(G, eid)
@@ -86,10 +85,9 @@ def graph_annotate_edge(G, eid):
         q = graphnode_position(G, eid[1])
         curvature = array([p, q])
 
-    geometry = to_linestring(curvature)
     length = curve_length(curvature)
 
-    set_edge_attributes(G, eid, {"curvature": curvature, "geometry": geometry, "length": length})
+    set_edge_attributes(G, eid, {"curvature": curvature, "length": length})
 
 # Correct potentially incorect node curvature (may be moving in opposing direction in comparison to start-node and end-node of edge).
 
@@ -115,14 +113,22 @@ def graph_correctify_edge_curvature_single(G, eid):
         # Then invert the direction back.
         logger("Invert curvature of edge ", (u, v, k))
         ps = ps[::-1]
-        geometry = to_linestring(ps)
-        nx.set_edge_attributes(G, {eid: {**attrs, "geometry": geometry, "curvature": ps}}) # Update geometry.
+        nx.set_edge_attributes(G, {eid: {**attrs, "curvature": ps}}) # (Cached geometry is derived again on access.)
 
 
+# * Only edges of which the curvature does not already run from start-node to end-node are inspected in detail.
 @info()
 def graph_correctify_edge_curvature(G, eid=None):
 
+    nid_positions = extract_node_positions_dictionary(G)
+
+    eids = []
     for eid, attrs in iterate_edges(G):
+        ps = attrs["curvature"]
+        if not (np.all(ps[0] == nid_positions[eid[0]]) and np.all(ps[-1] == nid_positions[eid[1]])):
+            eids.append(eid)
+
+    for eid in eids:
         graph_correctify_edge_curvature_single(G, eid)
 
 
@@ -130,7 +136,11 @@ def graph_correctify_edge_curvature(G, eid=None):
 
 # Replace edge with subedges with provided subcurves.
 # * Allow to provide either curve intervals to cut at or the actual subcurves to replace the edge with.
-def graph_cut_edge_subcurves(G, eid, qss, sanity_checks=False):
+# * Sanity checks default to the global validation level.
+def graph_cut_edge_subcurves(G, eid, qss, sanity_checks=None):
+
+    if sanity_checks == None:
+        sanity_checks = validate("full")
 
     if sanity_checks:
         # Store graph length for afterwards sanity checking graph length consistency.
@@ -147,6 +157,7 @@ def graph_cut_edge_subcurves(G, eid, qss, sanity_checks=False):
 
     # Remove the original edge.
     G.remove_edges_from([eid])
+    spatial_index_remove_edge(G, eid)
 
     nid = max(G.nodes()) + 1 # Nid for injected edge.
 
@@ -180,11 +191,17 @@ def graph_cut_edge_subcurves(G, eid, qss, sanity_checks=False):
 
     for eid, curvature in zip(new_eids, qss):
         # Fix curvature to match with `eid` order.
-        edges_to_add.append((*eid, {"curvature": curvature, "length": curve_length(curvature), "geometry": to_linestring(curvature)}))
+        edges_to_add.append((*eid, {"curvature": curvature, "length": curve_length(curvature)}))
 
     # Injected nodes and edges.
     G.add_nodes_from(nodes_to_add)
-    G.add_edges_from(edges_to_add)
+    keys = G.add_edges_from(edges_to_add) # (Keys of the injected edges in case of a multigraph.)
+
+    # Update spatial index of the graph (if any).
+    for nid in new_nids:
+        spatial_index_add_node(G, nid)
+    for i, eid in enumerate(new_eids):
+        spatial_index_add_edge(G, (*eid, keys[i]) if G.graph["simplified"] else eid)
 
     if sanity_checks:
         check(abs(graph_length(G) - length) < 0.001, expect="Expect graph length to remain consistent after cutting edges into subcurves." )
@@ -205,36 +222,120 @@ def graph_cut_edge_intervals(G, eid, intervals):
 
 
 # Ensure all edges have a maximal curve length. Cut curves if necessary.
+# * Every edge longer than `max_length` is cut into the minimal number of equally long subcurves.
+# * Cutpoints of all edges are computed at once (on the curvature buffer of all edges), the graph is updated in a single pass.
+# * Subedges only carry curvature and length (same as `graph_cut_edge_subcurves`), injected nodes only a position.
 @info()
-def graph_ensure_max_edge_length(G, max_length=50):
-
-    scheduled = [] # eid with number of necessary intervals.
-
-    # Compute subcurves to replace an edge with.
-    for eid, attrs in iterate_edges(G):
+def graph_ensure_max_edge_length(G, max_length=50, tolerance=0.000001):
+
+    eids, curvature, offsets = graphedges_to_curvature_arrays(G)
+
+    if len(eids) == 0:
+        return G
+
+    # Length of every line-segment in the curvature buffer (zero for the line-segment between consecutive curves).
+    segment_lengths = np.zeros(len(curvature))
+    segment_lengths[:-1] = norm(curvature[1:] - curvature[:-1], axis=1)
+    segment_lengths[offsets[1:] - 1] = 0
+
+    # Cumulative length at every curve point, with curve start and length per edge.
+    cumulative = np.concatenate(([0], np.cumsum(segment_lengths)[:-1]))
+    starts  = cumulative[offsets[:-1]]
+    lengths = cumulative[offsets[1:] - 1] - starts
+
+    # Number of pieces per edge.
+    pieces = np.maximum(np.ceil(lengths / max_length), 1).astype(int)
+    cut = np.flatnonzero(pieces > 1)
+
+    if len(cut) == 0:
+        return G
+
+    # Equally spaced cut distances (along the curvature buffer) of all edges to cut.
+    counts    = pieces[cut] - 1
+    cut_edges = np.repeat(cut, counts)
+    cut_steps = np.arange(len(cut_edges)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    distances = starts[cut_edges] + lengths[cut_edges] * cut_steps / pieces[cut_edges]
+
+    # Line-segment each cut falls in (snapping cuts onto a curve point if within tolerance).
+    segments = np.searchsorted(cumulative, distances, side="right") - 1
+    segments = np.clip(segments, offsets[cut_edges], offsets[cut_edges + 1] - 2)
+    snap = cumulative[segments + 1] - distances < tolerance
+    segments[snap] += 1
+    on_point = snap | (distances - cumulative[segments] < tolerance)
+    fractions = np.where(on_point, 0, (distances - cumulative[segments]) / np.where(segment_lengths[segments] > 0, segment_lengths[segments], 1))
+    cutpoints = curvature[segments] + fractions[:, None] * (curvature[segments + 1] - curvature[segments])
+
+    # Construct subcurves (and new nodes) per cut edge.
+    nid = max(G.nodes()) + 1 # Nid for injected nodes.
+    nodes_to_add = []
+    edges_to_add = []
+    i = 0 # Index of first cut of the current edge.
+    for e, m in zip(cut.tolist(), counts.tolist()):
+
+        eid = eids[e]
+        u, v = eid[0:2]
+
+        points = cutpoints[i:i + m]
+        firsts = segments[i:i + m] + 1 # Index of first curve point after each cut.
+        lasts  = np.where(on_point[i:i + m], segments[i:i + m], segments[i:i + m] + 1) # Index (exclusive) of final curve point before each cut.
+        i += m
+
+        # Subcurves: curve points between consecutive cuts (with cutpoints as endpoints).
+        bounds_start = np.concatenate(([offsets[e]], firsts))
+        bounds_end   = np.concatenate((lasts, [offsets[e + 1]]))
+        qss = []
+        for j in range(m + 1):
+            parts = [curvature[bounds_start[j]:bounds_end[j]]]
+            if j > 0:
+                parts.insert(0, points[j - 1:j])
+            if j < m:
+                parts.append(points[j:j + 1])
+            qss.append(np.concatenate(parts))
+
+        # New nodes at the cutpoints.
+        new_nids = list(range(nid, nid + m))
+        nid += m
+        nodes_to_add.extend((new_nid, {"y": y, "x": x}) for new_nid, (y, x) in zip(new_nids, points.tolist()))
+
+        # New edges (with `u <= v` and curvature in the direction of `u` to `v`).
+        path = [u] + new_nids + [v]
+        for a, b, qs in zip(path, path[1:], qss):
+            if a > b:
+                a, b, qs = b, a, qs[::-1]
+            edges_to_add.append((a, b, {"curvature": qs, "length": curve_length(qs)}))
+
+    # Replace edges in a single pass.
+    G.remove_edges_from([eids[e] for e in cut.tolist()])
+    G.add_nodes_from(nodes_to_add)
+    G.add_edges_from(edges_to_add)
+    drop_spatial_index(G)
 
-        ps = attrs["curvature"]
+    return G
 
-        qss = curve_cut_max_distance(ps, max_distance=max_length)
 
-        # Sanity check on subcurves.
-        if len(qss) > 1:
-            for qs in qss:
-                check(curve_length(qs) > 0, expect="Expect non-zero curvature on subcurve.")
-            for a, b in zip(qss, qss[1:]):
-                check((a[-1] == b[0]).all(), expect="Expect endpoint of previous subcurve matches startpoint of current subcurve.")
+# Test max edge length segmentation (straight, multi-point and snapped cuts, short and reversed subedges).
+def test_graph_ensure_max_edge_length():
 
-        # If the edge is being cut (thus more than 1 subcurve), then schedule it for injection.
-        if len(qss) > 1:
-            scheduled.append((eid, qss))
+    G = nx.MultiGraph()
+    G.graph.update({"simplified": True, "coordinates": "utm"})
+    G.add_nodes_from([(1, {"y": 0., "x": 0.}), (2, {"y": 0., "x": 120.}), (3, {"y": 40., "x": 100.}), (4, {"y": 150., "x": 0.}), (5, {"y": 0., "x": 150.})])
+    G.add_edge(1, 2, curvature=array([(0., 0.), (0., 120.)])) # Straight edge, three pieces of 40 meter.
+    G.add_edge(1, 3, curvature=array([(0., 0.), (30., 0.), (30., 40.), (40., 100.)])) # Multiple curve points.
+    G.add_edge(1, 4, curvature=array([(0., 0.), (50., 0.), (100., 0.), (150., 0.)])) # Cuts snap onto curve points.
+    G.add_edge(2, 5, curvature=array([(0., 120.), (0., 150.)])) # Short edge, not cut.
+    graph_annotate_edge_length(G)
+    length = graph_length(G)
 
-    # Inject edges.
-    for eid, qss in scheduled:
+    G = graph_ensure_max_edge_length(G, max_length=50)
 
-        # Graph is updated iteratively by replacing edge (by subcurves) one at a time.
-        G, _ = graph_cut_edge_subcurves(G, eid, qss)
-    
-    return G
+    assert abs(graph_length(G) - length) < 0.0001
+    assert len(G.edges) == 3 + 3 + 3 + 1
+    for (u, v, *_), attrs in iterate_edges(G):
+        ps = attrs["curvature"]
+        assert curve_length(ps) <= 50 + 0.0001
+        assert abs(attrs["length"] - curve_length(ps)) < 0.0001
+        assert np.all(ps[0] == graphnode_position(G, u)) and np.all(ps[-1] == graphnode_position(G, v))
+        assert np.all(norm(ps[1:] - ps[:-1], axis=1) > 0.0001) # (No duplicated curve points at snapped cuts.)
 
 
 # Cut graph edge at an interval (in range `[0, 1]`).
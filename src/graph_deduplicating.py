@@ -2,59 +2,57 @@ from external import *
 from graph_node_extraction import *
 from graph_curvature import *
 from graph_coordinates import *
+from graph_compact import *
 from utilities import *
 
-# Group duplicated nodes.
+# Group duplicated nodes (nodes within `eps` of one another, per coordinate).
+# * Nearby node pairs are found with a single KD-tree query, clusters are the connected components of these pairs (so nearby pairs chain into a single cluster).
+# * Clusters are ordered by (and start with) their first node in graph node order.
+# * Acts on a compact graph directly (see `CompactGraph`).
 def duplicated_nodes(G, eps=0.001):
 
-    # Make sure to act on UTM coordinated graph (to make sense of epsilon).
-    if G.graph["coordinates"] != "utm":
-        utm_info = graph_utm_info(G)
-        G = graph_transform_latlon_to_utm(G)
+    if type(G) == CompactGraph:
+        nids, positions = G.nids, G.positions
+    else:
+        nids, positions = graphnodes_to_arrays(G)
 
-    positions = extract_node_positions_dictionary(G)
-    tree = graphnodes_to_rtree(G)
-    bboxs = graphnodes_to_bboxs(G)
+    # Make sure to act on UTM coordinates (to make sense of epsilon).
+    if G.graph["coordinates"] != "utm":
+        positions = np.column_stack(latlons_to_utms(positions[:,0], positions[:,1]))
 
-    regions = [] # Collection of nodes which are adjacent.
+    if len(nids) < 2:
+        return []
 
-    # Nodes are iterated incrementally.
-    for nid in G.nodes():
+    # Find nearby node pairs (Chebyshev distance, matching the node bounding box padded by `eps`).
+    pairs = cKDTree(positions).query_pairs(r=eps, p=np.inf, output_type="ndarray")
+    if len(pairs) == 0:
+        return []
 
-        # Find nearby nodes.
-        bbox = pad_bounding_box(bboxs[nid], eps)
-        nids = set(intersect_rtree_bbox(tree, bbox))
+    # Union nearby nodes into clusters.
+    n = len(nids)
+    adjacency = csr_matrix((np.ones(len(pairs)), (pairs[:,0], pairs[:,1])), shape=(n, n))
+    _, labels = csgraph.connected_components(adjacency, directed=False)
 
-        # Clusters require at least two elements.
-        if len(nids) == 1:
-            continue
+    # Clusters require at least two elements.
+    members = np.flatnonzero(np.bincount(labels)[labels] > 1)
 
-        # Check some node already belongs to an existing cluster. 
-        has_found = False
-        for i, region in enumerate(regions):
-            # If such a cluster consist.
-            if len(nids & region) > 0:
-                # Then add all elements to this cluster.
-                regions[i] = region.union(nids)
-                break
-            
-        # Otherwise if we haven't found a cluster it partially belongs to.
-        if not has_found:
-            # Then we found a new isolated cluster.
-            regions.append(nids)
+    # Group members per cluster (a stable sort keeps node order within every group).
+    order = members[np.argsort(labels[members], kind="stable")]
+    groups = np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+    groups.sort(key=lambda group: group[0])
 
-    # Convert regions into lists.
-    return [list(region) for region in regions]
+    return [nids[group].tolist() for group in groups]
 
 
 # Deduplicates a graph. Reconnects edges of removed nodes (if any). 
+# * With `inplace` the graph itself is deduplicated (see `graph_to_transform`).
 @info()
-def graph_deduplicate(G, eps=0.001):
+def graph_deduplicate(G, eps=0.001, inplace=False):
 
     check(not G.graph["simplified"])
     check(G.graph["coordinates"] == "utm")
 
-    G = G.copy()
+    G = graph_to_transform(G, inplace=inplace)
 
     length = graph_length(G)
 
@@ -91,4 +89,7 @@ def graph_deduplicate(G, eps=0.001):
     new_length = graph_length(G)
     check(abs(length - new_length) <= len(nids_to_delete) * eps, expect="Expect total graph edge length remains the same after removing duplicated nodes.")
 
+    # Nodes got removed, so a spatial index on the graph is outdated.
+    drop_spatial_index(G)
+
     return G
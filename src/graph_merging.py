@@ -33,8 +33,9 @@ def prune_coverage_graph(G, prune_threshold=10, invert=False):
 # * Graph A has got its edges annotated with coverage threshold in relation to graph C.
 # * Extension 1: Removal of duplicates.
 # * Extension 2: Reconnecting C edges to injected A edges.
+# * With `inplace` graph C is merged into itself (see `graph_to_transform`), graph A is never mutated.
 @info()
-def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, reconnect_after=False):
+def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, reconnect_after=False, inplace=False):
 
     # Result object where the merge variants are stored under.
     graphs = {
@@ -54,17 +55,18 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
     check(prune_threshold <= A.graph['max_threshold'], expect="Expect we are pruning (on a threshold) below the maximum computed.")
     check(remove_duplicates or (remove_duplicates == reconnect_after), expect="Expect to only reconnect if duplicates are to be removed.")
 
-    _A = A
-    A = _A.copy()
+    # (A is not copied: Relabeling its nodes below constructs a new graph already.)
+    convert_to_latlon = C.graph["coordinates"] == "latlon"
+    if convert_to_latlon:
+        utm_info = graph_utm_info(C)
 
-    _C = C
-    C = _C.copy()
+    C = graph_to_transform(C, inplace=inplace)
 
     if A.graph["coordinates"] == "latlon":
         A = graph_transform_latlon_to_utm(A)
 
     if C.graph["coordinates"] == "latlon":
-        C = graph_transform_latlon_to_utm(C)
+        C = graph_transform_latlon_to_utm(C, inplace=True)
 
     # Relabel additional to prevent node id overlap. / # Adjust nids of A to ensure uniqueness once added to C.
     nid = max(C.nodes()) + 1
@@ -115,9 +117,6 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
     annotate_nodes(C, {"render": "original"})
     annotate_edges(C, {"render": "original"})
 
-    # Construct rtree on nodes in C.
-    nodetree = graphnodes_to_rtree(C)
-    
     ## Annotate origin attribute on B and C (Necessary in case we want to apply extensions).
     # Annotate "origin" of nodes and edges of C.
     annotate_edges(C, {"origin": "C"})
@@ -135,10 +134,8 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
     ## Add edge connections between B and C.
 
     # We want to connect edge endpoints (of B) to arbitrary node/edge of C.
-    # Therefore the node and edge tree we seek to search for are defined by C only.
-    node_tree = graphnodes_to_rtree(C)
-    edge_tree = graphedges_to_rtree(C)
-
+    # Therefore the nodes and edges of B are excluded from the (cached) node and edge tree of C.
+    # (The spatial index of C is kept up to date on injected connection edges and cut edges by `reconnect_node`.)
     excluded_eids = set(get_eids(B))
     excluded_nids = set(get_nids(B))
 
@@ -148,36 +145,22 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
     for nid in connect_nodes:
 
         # Add new edge connection from nid (potentially cuts an edge in half).
-        new_eid, injection_data = reconnect_node(C, nid, node_tree=node_tree, edge_tree=edge_tree, excluded_nids=excluded_nids, excluded_eids=excluded_eids.union(connections)) 
+        new_eid, injection_data = reconnect_node(C, nid, excluded_nids=excluded_nids, excluded_eids=excluded_eids.union(connections)) 
         set_edge_attributes(C, new_eid, {"render": "connection", "origin": "B"})
         connections.append(new_eid)
 
         # If we had to inject a node (to C) for a connection.
         if injection_data != None:
 
-            # Then update the node-tree and edge-tree.
-            new_nid, new_eids, old_eid = injection_data["new_nid"], injection_data["new_eids"], injection_data["old_eid"]
-
             # Update attributes of injected node as well.
-            set_node_attributes(C, new_nid, {"render": "connection", "origin": "C"})
+            set_node_attributes(C, injection_data["new_nid"], {"render": "connection", "origin": "C"})
             # (Note: No need to set render attribute of injected edges, those already have been copied over from the deleted edge in the `reconnect_node` function.)
 
-            # (Updating node tree.)
-            bbox = graphnode_to_bbox(C, new_nid)
-            add_rtree_bbox(node_tree, bbox, new_nid)
-
-            # (Insert new subedges to edge tree.)
-            add_rtree_bbox(edge_tree, graphedge_to_bbox(C, new_eids[0]), new_eids[0])
-            add_rtree_bbox(edge_tree, graphedge_to_bbox(C, new_eids[1]), new_eids[1])
-
-            # Exclude removed eid from intersection set.
-            # (Don't remove old edge from edge tree: Bug in rtree software causing error on subsequent hits.)
-            excluded_eids.add(old_eid)
-
     # Correctify edge curvature.
     graph_correctify_edge_curvature(C)
 
-    graphs["a"] = C.copy()
+    # (Only snapshot C if it is adjusted further.)
+    graphs["a"] = C.copy() if remove_duplicates or reconnect_after else C
     
     # Step 2: Remove duplicated edges of C.
     if remove_duplicates: 
@@ -195,8 +178,9 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
         B = C.edge_subgraph(B_eids)
 
         # Sanity check that B contains exactly those nodes in B_nids.
-        hits = [nid for connection in connections for nid in connection[:2]] # Those nodes endpoints of C connected to injected A edges.
-        check(set(B_nids).union(hits) == set(get_nids(B)), expect="Expect nids subgraph from C to match those nodes attributed with origin of B.")
+        if validate("full"):
+            hits = [nid for connection in connections for nid in connection[:2]] # Those nodes endpoints of C connected to injected A edges.
+            check(set(B_nids).union(hits) == set(get_nids(B)), expect="Expect nids subgraph from C to match those nodes attributed with origin of B.")
         
         # Obtain C graph before we injected edges.
         C_original = C.edge_subgraph(set([eid for eid, _ in iterate_edges(C)]) - set(B_eids))
@@ -239,7 +223,7 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
         # Delete nodes (Mark nodes for deletion).
         annotate_nodes(C, {"render": "deleted"}, nids=list(nodes_to_be_deleted))
     
-        graphs["b"] = C.copy()
+        graphs["b"] = C.copy() if reconnect_after else C
     
     # Step 3: Reconnect edges of C to injected edges of A into B.
     if reconnect_after:
@@ -257,7 +241,8 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
         C_current_eids = filter_eids_by_attribute(C, filter_func=lambda attrs: attrs["render"] != "deleted")
         C_deleted_eids = list(set(get_eids(C)) - set(C_current_eids))
 
-        check(set(C_deleted_eids) == set(filter_eids_by_attribute(C, filter_func=lambda attrs: attrs["render"] == "deleted")), expect="Expect all edges consist of union of disjoint deleted/not deleted edges.")
+        if validate("full"):
+            check(set(C_deleted_eids) == set(filter_eids_by_attribute(C, filter_func=lambda attrs: attrs["render"] == "deleted")), expect="Expect all edges consist of union of disjoint deleted/not deleted edges.")
 
         C_current = C.edge_subgraph(C_current_eids)
 
@@ -302,41 +287,35 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
         logger("Points to reconnect: ", nids_to_reconnect)
 
         # Reconnect these (original nodes of C) to the injected nodes of B.
-        edge_tree = graphedges_to_rtree(C)
-        node_tree = graphnodes_to_rtree(C)
-
+        # (The cached node and edge tree of C are reused and kept up to date by `reconnect_node`.)
         excluded_eids = set(get_eids(C)) - set(filter_eids_by_attribute(C, filter_attributes={"origin": "B"}))
         excluded_nids = set(get_nids(C)) - set(filter_nids_by_attribute(C, filter_attributes={"origin": "B"}))
 
         logger("Reconnecting nids.")
         for nid in nids_to_reconnect:
-            sanity_check_graph_curvature(C)
-            new_eid, injection_data = reconnect_node(C, nid, edge_tree=edge_tree, node_tree=node_tree, excluded_eids=excluded_eids, excluded_nids=excluded_nids, update_trees=True)
+            sanity_check_graph_curvature(C) # (Only with full validation.)
+            new_eid, injection_data = reconnect_node(C, nid, excluded_eids=excluded_eids, excluded_nids=excluded_nids)
 
             # Updat new eid with rendering.
             set_edge_attributes(C, new_eid, {"render": "connection", "origin": "C"})
 
+            # Do not reconnect to connection edges.
+            excluded_eids.add(new_eid)
+
             if injection_data != None:
 
                 # Update render attributes on injected elements.
-                new_nid, new_eids, old_eid = injection_data["new_nid"], injection_data["new_eids"], injection_data["old_eid"]
-                set_node_attributes(C, new_nid    , {"render": "connection", "origin": "B"})
+                set_node_attributes(C, injection_data["new_nid"], {"render": "connection", "origin": "B"})
                 # (Note: No need to set render attribute of injected edges, those already have been copied over from the deleted edge in the `reconnect_node` function.)
-
-                # Performance: Update reconnection data.
-                edge_tree = injection_data["edge_tree"]
-                node_tree = injection_data["node_tree"]
-                excluded_eids = injection_data["excluded_eids"]
     
         graphs["metadata"]["3.reconnected"] = len(nids_to_reconnect)
-        graphs["c"] = C.copy()
+        graphs["c"] = C
     
     # Convert back graphs to latlon coordinates if necessary.
-    if _C.graph["coordinates"] == "latlon":
-        utm_info = graph_utm_info(_C)
-        graphs["a"] = graph_transform_utm_to_latlon(graphs["a"], "", **utm_info) 
-        graphs["b"] = graph_transform_utm_to_latlon(graphs["b"], "", **utm_info) 
-        graphs["c"] = graph_transform_utm_to_latlon(graphs["c"], "", **utm_info) 
+    if convert_to_latlon:
+        graphs["a"] = graph_transform_utm_to_latlon(graphs["a"], "", **utm_info, inplace=True) 
+        graphs["b"] = graph_transform_utm_to_latlon(graphs["b"], "", **utm_info, inplace=True) 
+        graphs["c"] = graph_transform_utm_to_latlon(graphs["c"], "", **utm_info, inplace=True) 
 
     return graphs 
 
@@ -344,9 +323,9 @@ def merge_graphs(C=None, A=None, prune_threshold=20, remove_duplicates=False, re
 # Reconnect node to graph.
 # * Returns inject eid.
 # * Optionally allow only to reconnect to a subselection of nodes and/or edges.
-# * Pass forward node_tree and edge_tree to significantly improve performance.
+# * Uses (and updates) the spatial index cached on the graph, unless a node_tree and edge_tree are passed explicitly.
 @info()
-def reconnect_node(G, nid, node_tree=None, edge_tree=None, nid_distance=10, excluded_nids=set(), excluded_eids=set(), update_trees=False):
+def reconnect_node(G, nid, node_tree=None, edge_tree=None, nid_distance=10, excluded_nids=set(), excluded_eids=set()):
 
     # Injection data (Set if we cut edge).
     injection_data = None
@@ -397,27 +376,6 @@ def reconnect_node(G, nid, node_tree=None, edge_tree=None, nid_distance=10, excl
     G.add_edge(*eid)
     graph_annotate_edge(G, eid)
     graph_correctify_edge_curvature_single(G, eid)
-
-    # Optionally update tree and node exclusion information if a node is injected to nearest edge.
-    if update_trees and injection_data != None:
-
-        # Then update the node-tree and edge-tree.
-        new_nid, new_eids, old_eid = injection_data["new_nid"], injection_data["new_eids"], injection_data["old_eid"]
-
-        # (Updating node tree.)
-        bbox = graphnode_to_bbox(G, new_nid)
-        add_rtree_bbox(node_tree, bbox, new_nid)
-
-        # (Insert new subedges to edge tree.)
-        add_rtree_bbox(edge_tree, graphedge_to_bbox(G, new_eids[0]), new_eids[0])
-        add_rtree_bbox(edge_tree, graphedge_to_bbox(G, new_eids[1]), new_eids[1])
-
-        # Exclude removed eid from intersection set.
-        # (Don't remove old edge from edge tree: Bug in rtree software causing error on subsequent hits.)
-        excluded_eids.add(old_eid)
-    
-        injection_data["edge_tree"] = edge_tree
-        injection_data["node_tree"] = node_tree
-        injection_data["excluded_eids"] = excluded_eids
+    spatial_index_add_edge(G, eid)
 
     return eid, injection_data
@@ -44,12 +44,13 @@ def walk_path(G, startpoint, first_edge_to_walk, endpoints):
 # Determine if a node is a true endpoint of an edge.
 # * It is its own neighbor (ie, it self-loops).
 # * It does not have exactly two neighbors and degree of 2 or 4.
-def is_endpoint(G, nid):
+# * Optionally provide the node degrees (to not look them up per node).
+def is_endpoint(G, nid, degrees=None):
 
     # Obtain neighbors for node.
-    neighbors = list(G.adj[nid].keys()) # list(G.neighbors(nid))
+    neighbors = G.adj[nid] # list(G.neighbors(nid))
     n = len(neighbors)
-    d = G.degree[nid]
+    d = degrees[nid] if degrees != None else G.degree[nid]
 
     return (nid in neighbors) or (n != 2) or (d != 2)
     
@@ -58,7 +59,8 @@ def is_endpoint(G, nid):
 # * Yields a list of `(startnid, endnid, traversed_nids, traversed_eids)`.
 def graph_paths_to_simplify(G):
 
-    endpoints = {nid for nid in G.nodes if is_endpoint(G, nid)}
+    degrees = dict(G.degree())
+    endpoints = {nid for nid in G.nodes if is_endpoint(G, nid, degrees=degrees)}
 
     # Obtain paths to simplify (fold) into a single edge.
     walked_eids = set()
@@ -78,7 +80,7 @@ def graph_paths_to_simplify(G):
             path = nids, eids = walk_path(G, startpoint, connected_eid, endpoints)
 
             # Mark path edges as discovered.
-            walked_eids = walked_eids.union(eids)
+            walked_eids.update(eids)
 
             # Only yield path if it is traversing at one nid in the middle or if its a self-loop.
             if len(nids) > 2 or nids[0] == nids[1]:
@@ -87,27 +89,37 @@ def graph_paths_to_simplify(G):
 
 # Simplify graph (fuse edge curvature).
 # Optionally retain attributes on edges.
+# * Runs linear in the graph size: Every edge is walked once and the curvature of a path is concatenated at once.
+# * Sanity checks on the input graph and on the concatenated curvature are optional (`sanity_checks`, defaults to the global validation level).
+# * With `inplace` a simplified (multi-)graph is simplified itself (see `graph_to_transform`), a vectorized graph is always converted into a new multigraph.
 @info()
-def simplify_graph(G, retain_attributes=False, attributes_to_ignore = ["length", "curvature", "geometry", "threshold", "covered_by", "vectorized_from"]): 
+def simplify_graph(G, retain_attributes=False, attributes_to_ignore = ["length", "curvature", "geometry", "geometry_curvature", "threshold", "covered_by", "vectorized_from"], sanity_checks=None, inplace=False): 
 
-    # Sanity check node position starts/ends at all edge curves.
-    sanity_check_graph_curvature(G)
-
-    graph_annotate_edge_curvature(G)
-    graph_correctify_edge_curvature(G)
+    if sanity_checks == None:
+        sanity_checks = validate("full")
 
-    G = G.copy()
+    # Sanity check node position starts/ends at all edge curves.
+    if sanity_checks:
+        sanity_check_graph_curvature(G)
 
     if type(G) == nx.Graph:
         
-        # We require it to be a multigraph.
+        # We require it to be a multigraph (constructing it copies the graph).
         G = nx.MultiGraph(G)
 
         # Set simplified to True here, since most of your functions decide on Graph/Multigraph logic based on this attribute.
         G.graph["simplified"] = True
 
+    else:
+        G = graph_to_transform(G, inplace=inplace)
+
+    # (Annotate and correct curvature on the graph we own, the caller's graph is left untouched.)
+    graph_annotate_edge_curvature(G)
+    graph_correctify_edge_curvature(G)
+
     # Sanity check that curvature attribute is present on every edge in the graph.
-    [check("curvature" in attrs, expect="Expect curvature in all edges to concatenate with simplification (if necessary).") for eid, attrs in iterate_edges(G)]
+    if sanity_checks:
+        [check("curvature" in attrs, expect="Expect curvature in all edges to concatenate with simplification (if necessary).") for eid, attrs in iterate_edges(G)]
 
     nid_positions = extract_node_positions_dictionary(G)
 
@@ -124,40 +136,45 @@ def simplify_graph(G, retain_attributes=False, attributes_to_ignore = ["length",
         ## Accumulate curvature.
 
         # Start curvature with first nid position.
-        curvature = [nid_positions[visited_nids[0]]]
+        subcurves = [nid_positions[visited_nids[0]][None, :]]
+        endpoint = nid_positions[visited_nids[0]]
 
         for eid in visited_eids: 
 
             subcurve = get_edge_attributes(G, eid=eid)["curvature"]
 
             # Sanity check on subcurve.    
-            check((subcurve[0] == curvature[-1]).all() or (subcurve[-1] == curvature[-1]).all(), expect="Expect subcurve to start (or end) at current curvature endpoint.")
+            if sanity_checks:
+                check((subcurve[0] == endpoint).all() or (subcurve[-1] == endpoint).all(), expect="Expect subcurve to start (or end) at current curvature endpoint.")
 
             # Optionally reverse the extension.
-            if np.all(subcurve[-1] == curvature[-1]):
-                subcurve = list(reversed(subcurve))
+            if np.all(subcurve[-1] == endpoint):
+                subcurve = subcurve[::-1]
 
             # (Since curvature contains endpoint to endpoint, we take entire curvature except the first point.)
-            curvature.extend(subcurve[1:])
+            subcurves.append(subcurve[1:])
+            endpoint = subcurve[-1]
 
-        # Flatten and array curvature.
-        curvature = array(curvature) 
+        # Flatten curvature.
+        curvature = np.concatenate(subcurves)
 
         # Sanity checks on curvature (array shape and length consistency).
-        check(curvature.shape[1] == 2, expect="Expect concatenated curvature to be flattened into a sequence of two-dimensional points.")
-        check(abs(curve_length(curvature) - sum([curve_length(get_edge_attributes(G, eid=eid)["curvature"]) for eid in visited_eids]) < 0.001), expect="Expect curvature length to be consistent after concatenation.")
+        if sanity_checks:
+            check(curvature.shape[1] == 2, expect="Expect concatenated curvature to be flattened into a sequence of two-dimensional points.")
+            check(abs(curve_length(curvature) - sum([curve_length(get_edge_attributes(G, eid=eid)["curvature"]) for eid in visited_eids]) < 0.001), expect="Expect curvature length to be consistent after concatenation.")
 
         # Reverse curvature if necessary.
         u, v = min(visited_nids[0], visited_nids[-1]), max(visited_nids[0], visited_nids[-1])
         if np.all(nid_positions[u] == curvature[-1]):
-            curvature = array(list(reversed(curvature)))
+            curvature = curvature[::-1]
 
         p, q = nid_positions[u], nid_positions[v]
         ps = curvature
-        check(np.all(p == ps[0]), expect="Expect curvature of all connected edges starts/end at node position.")
-        check(np.all(q == ps[-1]), expect="Expect curvature of all connected edges starts/end at node position.")
+        if sanity_checks:
+            check(np.all(p == ps[0]), expect="Expect curvature of all connected edges starts/end at node position.")
+            check(np.all(q == ps[-1]), expect="Expect curvature of all connected edges starts/end at node position.")
 
-        attributes = {"curvature": curvature}
+        attributes = {"curvature": curvature, "length": float(np.sum(norm(curvature[1:] - curvature[:-1], axis=1)))}
 
         ## Collecting edge attributes.
         if retain_attributes:
@@ -184,28 +201,36 @@ def simplify_graph(G, retain_attributes=False, attributes_to_ignore = ["length",
                 path_attributes[attr] = path_attributes[attr][0]
 
             # Add these attributes alongside the curvature.
-            attributes = {"curvature": curvature, **path_attributes}
+            attributes = {**attributes, **path_attributes}
 
         # Prepare data for insertion/deletion to/from graph.
-        new_edges.append((u, v, attributes))
+        # (Zero-length self-loops are dropped.)
+        if u != v or attributes["length"] > 0:
+            new_edges.append((u, v, attributes))
         eids_to_drop.extend(visited_eids)
         nids_to_drop.extend(visited_nids[1:-1])
 
-    # Add new edges to the graph.
-    for u, v, attrs in new_edges:
-        G.add_edge(u, v, **attrs)
-
-    # Drop intermediate nids in walk.
+    # Drop walked eids.
     G.remove_edges_from(eids_to_drop)
-    # Drop all walked eids.
+    # Drop intermediate nids in walk.
     G.remove_nodes_from(nids_to_drop)
+    # Add new edges to the graph.
+    G.add_edges_from(new_edges)
 
     # Mark the graph as having been simplified.
     G.graph["simplified"] = True
 
-    # Annotate geometry and length on the simplified edges.
-    graph_annotate_edge_geometry(G)
-    graph_annotate_edge_length(G)
+    # Annotate length on edges lacking it (simplified edges already have their length, geometry is derived on access).
+    for eid, attrs in iterate_edges(G):
+        if "length" not in attrs:
+            attrs["length"] = curve_length(attrs["curvature"])
+
+    if sanity_checks:
+        sanity_check_edge_length(G)
+        sanity_check_graph_curvature(G)
+
+    # Nodes and edges changed, so a spatial index on the graph is outdated.
+    drop_spatial_index(G)
 
     return G
 
@@ -216,12 +241,12 @@ def simplify_graph(G, retain_attributes=False, attributes_to_ignore = ["length",
 
 # Drop self-loops and multi-edges from graph.
 @info()
-def graph_sanitize_simplified_edges(G):
+def graph_sanitize_simplified_edges(G, inplace=False):
 
     if not G.graph["simplified"]:
         return G
     
-    G = G.copy()
+    G = graph_to_transform(G, inplace=inplace)
 
     self_loops = [(u, v, k) for (u, v, k), _ in iterate_edges(G) if u == v]
     multi_edges = [(u, v, k) for (u, v, k), _ in iterate_edges(G) if u != v and k > 0]
@@ -271,12 +296,13 @@ def group_multi_edges(G):
 # Vectorize a network and annotate every vectorized edge with its original simplified edge.
 # Note: Edge attributes are propogated to all new subcurve edges.
 # Note: Node attributes are propogated from starting node (index `u`).
+# Note: With `inplace` the simplified graph is consumed (see `graph_to_transform`), the vectorized graph is always a new graph.
 @info()
-def vectorize_graph(G):
+def vectorize_graph(G, inplace=False):
     
     check(G.graph["simplified"], expect="Expect graph to be simplified in order to vectorize it.")
 
-    G = G.copy()
+    G = graph_to_transform(G, inplace=inplace)
 
     # Extract nodes and edges.
     node_positions = extract_node_positions_dictionary(G)
@@ -337,11 +363,10 @@ def vectorize_graph(G):
 
                 # New curvature-related attributes.
                 curvature = [node_positions[u], node_positions[v]]
-                geometry = to_linestring(curvature)
                 length = curve_length(curvature)
 
                 # Note: Set key at zero, because nodes in curvature implies a single path between nodes.
-                new_edges.append((u, v, {**old_edge_attrs, "curvature": curvature, "geometry": geometry, "length": length}))
+                new_edges.append((u, v, {**attributes_without_geometry(old_edge_attrs), "curvature": curvature, "length": length}))
 
                 # Track "vectorized_by".
                 vectorized_from[(u, v)] = eid
@@ -3,7 +3,7 @@ from utilities import *
 
 # Extract subgraph by a point and a radius (using a square rather than circle for distance measure though).
 def extract_subgraph(G, ps, lam):
-    edgetree = graphedges_to_rtree(G) # Place graph edges by coordinates in accelerated data structure (R-Tree).
+    edgetree = graph_edge_rtree(G) # Place graph edges by coordinates in accelerated data structure (R-Tree, cached on the graph).
     bbox = bounding_box(ps, lam)
     edges = list(edgetree.intersection((bbox[0][0], bbox[0][1], bbox[1][0], bbox[1][1]))) # Extract edges within bounding box.
     subG = G.edge_subgraph(edges)
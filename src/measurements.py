@@ -28,11 +28,16 @@ def generate_maps(threshold = 30, debugging=False, **reading_props):
         _read_and_or_write = lambda filename, action, **props: read_and_or_write(f"data/pickled/{place}-{filename}", action, **props)
 
         # Source graph.
-        osm = _read_and_or_write("osm", lambda:simp(dedup(to_utm(read_graph(place=place, graphset=links["osm"])))), **reading_props)
+        # (Ownership of the freshly read graph is passed along the transforms, so none of them copies it.)
+        osm = _read_and_or_write("osm", lambda:simp(dedup(to_utm(read_graph(place=place, graphset=links["osm"]), inplace=True), inplace=True), inplace=True), **reading_props)
 
         # Starting graphs.
-        sat = _read_and_or_write("sat", lambda:simp(dedup(to_utm(read_graph(place=place, graphset=links["sat"])))), **reading_props)
-        gps = _read_and_or_write("gps", lambda:simp(dedup(to_utm(read_graph(place=place, graphset=links["gps"])))), **reading_props)
+        sat = _read_and_or_write("sat", lambda:simp(dedup(to_utm(read_graph(place=place, graphset=links["sat"]), inplace=True), inplace=True), inplace=True), **reading_props)
+        gps = _read_and_or_write("gps", lambda:simp(dedup(to_utm(read_graph(place=place, graphset=links["gps"]), inplace=True), inplace=True), inplace=True), **reading_props)
+
+        # The input graphs are kept in the resulting maps, so transforms are not allowed to mutate them.
+        for G in [osm, sat, gps]:
+            protect_graph(G)
 
         # If we are debugging on the merging logic.
         if debugging:
@@ -49,6 +54,9 @@ def generate_maps(threshold = 30, debugging=False, **reading_props):
         gps_vs_sat = edge_graph_coverage(gps, sat, max_threshold=threshold)
         graphs     = merge_graphs(C=sat, A=gps_vs_sat, prune_threshold=threshold, remove_duplicates=True, reconnect_after=True)
 
+        for G in [osm, sat, gps]:
+            sanity_check_protected_graph(G)
+
         maps[place] = {
             "osm": osm,
             "sat": sat,
@@ -78,15 +86,26 @@ def compute_apls(truth, proposed):
 
 
 # Prepare graph for TOPO computations.
+# Note: With `use_cache` the prepared graph is read from (or written to) the prepared graph cache on disk (see `read_or_prepare_graph`).
+#       Bump `prepared_graph_version` when changing what this preparation produces.
+# Note: With `inplace` the graph itself is prepared (see `graph_to_transform`).
 @info()
-def prepare_graph_for_topo(G):
+def prepare_graph_for_topo(G, use_cache=False, inplace=False):
 
     if "prepared" in G.graph and G.graph["prepared"] == "topo":
         return G
 
-    G = G.copy()
+    # TOPO acts on (networkx) graphs with edge geometry, so a compact graph is converted (thereby we own it).
+    if type(G) == CompactGraph:
+        G = compact_to_graph(G)
+        inplace = True
 
-    G = simplify_graph(G)
+    if use_cache:
+        G = read_or_prepare_graph(G, lambda: prepare_graph_for_topo(G, inplace=inplace), prepared="topo")
+        graph_annotate_edge_geometry(G) # TOPO reads edge geometry, which is not stored with the graph.
+        return G
+
+    G = simplify_graph(G, inplace=inplace)
     G = G.to_directed(G)
     G = nx.MultiGraph(G)
 
@@ -99,12 +118,13 @@ def prepare_graph_for_topo(G):
     return G
 
 # Copmute TOPO metric between two graphs.
+# * Use `workers` to distribute the origin nodes over a process pool (scores are identical to running on a single process).
 @info()
-def compute_topo(truth, proposed):
+def compute_topo(truth, proposed, workers=1):
 
     truth, proposal = prepare_graph_for_topo(truth), prepare_graph_for_topo(proposed)
-    topo_score = compute_topo_on_prepared_graph(truth, proposed)
-    topo_prime_score = compute_topo_on_prepared_graph(truth, proposed, prime=True)
+    topo_score = compute_topo_on_prepared_graph(truth, proposed, workers=workers)
+    topo_prime_score = compute_topo_on_prepared_graph(truth, proposed, prime=True, workers=workers)
 
     return topo_score, topo_prime_score
 
@@ -125,7 +145,7 @@ def precompute_measurements_maps(maps):
             # Drop deleted edges before continuing.
             def remove_deleted(G):
 
-                G = G.copy()
+                G = as_networkx_graph(G).copy()
 
                 edges_to_be_deleted = filter_eids_by_attribute(G, filter_attributes={"render": "deleted"})
                 nodes_to_be_deleted = filter_nids_by_attribute(G, filter_attributes={"render": "deleted"})
@@ -139,16 +159,22 @@ def precompute_measurements_maps(maps):
             graph = remove_deleted(graph)
 
             result[place][map_variant] = {
-                "topo": prepare_graph_for_topo(graph),
-                "apls": prepare_graph_for_apls(graph),
+                "topo": prepare_graph_for_topo(graph, use_cache=True),
+                "apls": prepare_graph_for_apls(graph, use_cache=True, inplace=True), # (The graph without deleted edges is ours.)
             }
+
+        # Preparation acts on copies, the (protected) input graphs are left untouched.
+        for map_variant in maps[place]:
+            if map_variant != "metadata":
+                sanity_check_protected_graph(maps[place][map_variant])
     
     return result
 
 
 # Compute TOPO/APLS results on maps.
+# * Use `workers` to compute TOPO on a process pool (see `compute_topo`).
 @info(timer=True)
-def apply_measurements_maps(prepared_maps, threshold=30):
+def apply_measurements_maps(prepared_maps, threshold=30, workers=1):
 
     result = {}
 
@@ -173,7 +199,7 @@ def apply_measurements_maps(prepared_maps, threshold=30):
             check("prepared" in proposed_topo.graph and proposed_topo.graph["prepared"] == "topo", expect="Expect prepared proposed graph when computing topo metric.")
 
             apls, apls_prime = compute_apls(truth_apls, proposed_apls)
-            topo, topo_prime = compute_topo(truth_topo, proposed_topo)
+            topo, topo_prime = compute_topo(truth_topo, proposed_topo, workers=workers)
 
             result[place][map_variant] = {
                 "apls": apls,
@@ -322,14 +348,19 @@ def experiment_two_measure_threshold_values(lowest = 1, highest = 50, step = 1):
     }
 
     # Generate threshold_maps for thresholds.
+    # * Every fusion map is stored separately and read lazily (memory-mapped), so not all maps are held in memory at once.
     def compute_threshold_maps():
         threshold_maps = {}
         for threshold in range(lowest, highest, step):
             print(f"Generating map with threshold {threshold}.")
-            maps = read_and_or_write(f"data/pickled/threshold_maps-{threshold}", lambda: generate_maps(threshold = threshold, **reading_props), **reading_props)
+            maps = {} # Only read (or generate) all maps of this threshold if a fusion map is not stored yet.
+            def read_maps():
+                if "maps" not in maps:
+                    maps["maps"] = read_and_or_write(f"data/pickled/threshold_maps-{threshold}", lambda: generate_maps(threshold = threshold, **reading_props), **reading_props)
+                return maps["maps"]
             threshold_maps[threshold] = {}
-            threshold_maps[threshold]["berlin"]  = maps["berlin"]["c"]
-            threshold_maps[threshold]["chicago"] = maps["chicago"]["c"]
+            for place in ["berlin", "chicago"]:
+                threshold_maps[threshold][place] = read_and_or_write(f"data/pickled/threshold_maps-{threshold}-{place}", lambda: read_maps()[place]["c"], **{**reading_props, "is_graph": True}, lazy=True)
         return threshold_maps
     
 
@@ -351,18 +382,23 @@ def experiment_two_measure_threshold_values(lowest = 1, highest = 50, step = 1):
 
                 return G
         
+            # (The graph without deleted edges is ours, so the final preparation step can take ownership of it.)
             graph = remove_deleted(graph)
             return {
                 "topo": prepare_graph_for_topo(graph),
-                "apls": prepare_graph_for_apls(graph),
+                "apls": prepare_graph_for_apls(graph, inplace=True),
             }
 
         precomputed_graphs = {}
         for threshold in range(lowest, highest, step):
             print(f"Preparing graph for topo and apls ({threshold}).")
             precomputed_graphs[threshold] = {}
-            precomputed_graphs[threshold]["berlin"]  = precompute_measurement_map(threshold_maps[threshold]["berlin"])
-            precomputed_graphs[threshold]["chicago"] = precompute_measurement_map(threshold_maps[threshold]["chicago"])
+            for place in ["berlin", "chicago"]:
+                graph = threshold_maps[threshold][place]
+                precomputed_graphs[threshold][place] = precompute_measurement_map(graph)
+                # Free the networkx graph of the lazily read fusion map again.
+                if type(graph) == LazyGraph:
+                    graph.release()
         return precomputed_graphs
 
 
@@ -378,11 +414,11 @@ def experiment_two_measure_threshold_values(lowest = 1, highest = 50, step = 1):
         osm_chicago = simp(dedup(to_utm(read_graph(place="chicago", graphset=links["osm"]))))
         truth = {}
         truth["berlin"] = {}
-        truth["berlin"]["apls"]  = prepare_graph_for_apls(osm_berlin)
-        truth["berlin"]["topo"]  = prepare_graph_for_topo(osm_berlin)
+        truth["berlin"]["apls"]  = prepare_graph_for_apls(osm_berlin, use_cache=True)
+        truth["berlin"]["topo"]  = prepare_graph_for_topo(osm_berlin, use_cache=True)
         truth["chicago"] = {}
-        truth["chicago"]["apls"] = prepare_graph_for_apls(osm_chicago)
-        truth["chicago"]["topo"] = prepare_graph_for_topo(osm_chicago)
+        truth["chicago"]["apls"] = prepare_graph_for_apls(osm_chicago, use_cache=True)
+        truth["chicago"]["topo"] = prepare_graph_for_topo(osm_chicago, use_cache=True)
 
         result = {}
         result["berlin"] = {}
@@ -664,11 +700,11 @@ def experiment_three_sample_histogram():
         osm_chicago = simp(dedup(to_utm(read_graph(place="chicago", graphset=links["osm"]))))
         truth = {}
         truth["berlin"] = {}
-        truth["berlin"]["apls"]  = prepare_graph_for_apls(osm_berlin)
-        truth["berlin"]["topo"]  = prepare_graph_for_topo(osm_berlin)
+        truth["berlin"]["apls"]  = prepare_graph_for_apls(osm_berlin, use_cache=True)
+        truth["berlin"]["topo"]  = prepare_graph_for_topo(osm_berlin, use_cache=True)
         truth["chicago"] = {}
-        truth["chicago"]["apls"] = prepare_graph_for_apls(osm_chicago)
-        truth["chicago"]["topo"] = prepare_graph_for_topo(osm_chicago)
+        truth["chicago"]["apls"] = prepare_graph_for_apls(osm_chicago, use_cache=True)
+        truth["chicago"]["topo"] = prepare_graph_for_topo(osm_chicago, use_cache=True)
 
         # Load Sat, GPS, merged.
         maps = read_and_or_write(f"data/pickled/threshold_maps-{threshold}", lambda: generate_maps(threshold = threshold, **reading_props), **reading_props)
@@ -689,8 +725,8 @@ def experiment_three_sample_histogram():
                 #. samples["C"] # Both graphs have control points and a path between them.
                 #. A and B both move to zero.
                 #. C moves to path_scores `[float(v) for v in data["left"]["path_scores"]]`
-                result[place][maptype]["apls"][0] = len(apls_samples["left"]["samples"]["A"]) + len(apls_samples["left"]["samples"]["B"]) \
-                                                    + len(apls_samples["right"]["samples"]["A"]) + len(apls_samples["right"]["samples"]["B"])
+                result[place][maptype]["apls"][0] = apls_samples["left"]["samples"]["A"] + apls_samples["left"]["samples"]["B"] \
+                                                    + apls_samples["right"]["samples"]["A"] + apls_samples["right"]["samples"]["B"]
                 for v in [floor(float(v) * 100) for v in apls_samples["left"]["path_scores"]]:
                     result[place][maptype]["apls"][v] += 1
                 for v in [floor(float(v) * 100) for v in apls_samples["right"]["path_scores"]]:
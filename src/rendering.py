@@ -262,7 +262,7 @@ def preplot_graph(G, ax, node_properties=None, edge_properties=None):
         if not G.graph["simplified"]:
             return LineString((Point((x_lookup[u], y_lookup[u])), Point((x_lookup[v], y_lookup[v]))))
         else:
-            return data["geometry"] # Always exists on simplified graph.
+            return attributes_geometry(data) # Derived from curvature on simplified graph.
 
     if not G.graph["simplified"]:
         u, v, data = zip(*[(u, v, attrs) for (u, v), attrs in iterate_edges(G)])
@@ -7,7 +7,10 @@ Created on Mon May  6 14:05:30 2019
 """
 
 import numpy as np
+import networkx as nx
 import scipy.spatial
+import scipy.sparse
+import scipy.sparse.csgraph
 import geopandas as gpd
 import shapely
 import time
@@ -107,6 +110,82 @@ def _nodes_near_origin(G_, node, kdtree, kd_idx_dic,
     return node_names, dists_m_refine  # G_sub
 
 
+###############################################################################
+def _nodes_near_origin_network(G_, node, radius_m=150, weight='length',
+                               csr_graph=None, verbose=False):
+    '''Get nodes within a network distance radius_m of the desired node,
+    with a single Dijkstra search cut off at radius_m.  Every returned node
+    connects to the origin.  If csr_graph (see G_to_csr()) is given, search
+    on it rather than on G_
+    Return node names and their network distances'''
+
+    if csr_graph is None:
+        dists = nx.single_source_dijkstra_path_length(
+            G_, node, cutoff=radius_m, weight=weight)
+        node_names, node_dists = list(dists.keys()), list(dists.values())
+    else:
+        node_idx_dic, nodes, matrix = csr_graph
+        dists = scipy.sparse.csgraph.dijkstra(
+            matrix, directed=False, indices=node_idx_dic[node],
+            limit=radius_m)
+        idxs = np.flatnonzero(dists <= radius_m)
+        node_names = [nodes[i] for i in idxs]
+        node_dists = list(dists[idxs])
+
+    if verbose:
+        print(("subgraph node_names:", node_names))
+
+    return node_names, node_dists
+
+
+###############################################################################
+def G_to_csr(G_, weight='length'):
+    """
+    Create a sparse adjacency matrix of edge weights, to search shortest
+    paths on with scipy.sparse.csgraph.
+
+    Notes
+    -----
+    Only the lowest weight of parallel edges is kept, self-loops are
+    dropped.
+
+    Arguments
+    ---------
+    G_ : networkx graph
+        Input networkx graph, with edges assumed to have the weight property.
+    weight : str
+        Name of the edge weight. Defaults to ``'length'``.
+
+    Returns
+    -------
+    node_idx_dic, nodes, matrix : tuple
+        node_idx_dic maps node name to matrix entry
+        nodes lists the node name of every matrix entry
+        matrix is the scipy.sparse.csr_matrix of edge weights
+    """
+
+    nodes = list(G_.nodes())
+    node_idx_dic = {n: i for i, n in enumerate(nodes)}
+
+    weights = {}
+    for u, v, data in G_.edges(data=True):
+        if u == v:
+            continue
+        i, j = node_idx_dic[u], node_idx_dic[v]
+        key = (min(i, j), max(i, j))
+        weights[key] = min(weights.get(key, np.inf), data[weight])
+
+    rows = np.array([i for i, j in weights], dtype=int)
+    cols = np.array([j for i, j in weights], dtype=int)
+    vals = np.array(list(weights.values()), dtype=float)
+    matrix = scipy.sparse.csr_matrix(
+        (np.concatenate((vals, vals)),
+         (np.concatenate((rows, cols)), np.concatenate((cols, rows)))),
+        shape=(len(nodes), len(nodes)))
+
+    return node_idx_dic, nodes, matrix
+
+
 ###############################################################################
 def G_to_kdtree(G_, x_coord='x', y_coord='y', verbose=False):
     """
@@ -18,6 +18,7 @@ import networkx as nx
 import scipy.spatial
 import matplotlib.pyplot as plt
 import copy
+import multiprocessing
 from matplotlib.patches import Circle
 from matplotlib.collections import PatchCollection
 from shapely.geometry import Point, LineString
@@ -585,13 +586,316 @@ def insert_holes_or_marbles(G_, origin_node, interval=50, n_id_add_val=1,
     return Gout, xms, yms
 
 
+###############################################################################
+def precompute_holes_or_marbles(G_, interval=50, x_coord='x', y_coord='y'):
+    """
+    Sample points on every edge of the graph on the specified interval once,
+    for use with holes_or_marbles_near_origin().
+
+    Notes
+    -----
+    Points are placed as insert_holes_or_marbles() does, at distances
+    interval, 2*interval, ... along the edge geometry.  Since the geometry
+    direction depends on the origin (see ensure_radial_linestrings()), the
+    points are sampled from both edge endpoints.
+
+    Arguments
+    ---------
+    G_ : networkx graph
+        Input graph, edges are assumed to have 'geometry' and 'length'.
+    interval : float
+        Spacing of the sampled points. Defaults to ``50``.
+    x_coord : str
+        Name of x_coordinate. Defaults to ``'x'``.
+    y_coord : str
+        Name of y_coordinate. Defaults to ``'y'``.
+
+    Returns
+    -------
+    samples : dict
+        'index' maps node name to node index, 'positions' are the node
+        positions, 'starts' and 'ends' are the node indexes at the start
+        and end of every edge geometry, 'lengths' the edge lengths and
+        'offsets' the range of sampled points of every edge.
+        'dists' is the distance of every sampled point to the edge endpoint
+        it is sampled from, 'xy_start' and 'xy_end' are the sampled points
+        running from the geometry start and end respectively.
+    """
+
+    nodes = list(G_.nodes())
+    index = {n: i for i, n in enumerate(nodes)}
+    positions = apls_utils._get_node_positions(G_, x_coord=x_coord,
+                                               y_coord=y_coord)
+
+    starts, ends, lengths, counts = [], [], [], []
+    dists, xy_start, xy_end = [], [], []
+    for u, v, data in G_.edges(data=True):
+
+        line = data['geometry']
+        linelen = data['length']
+
+        # check which endpoint the linestring starts at
+        geom_p0 = list(line.coords)[0]
+        dist_to_u = scipy.spatial.distance.euclidean(positions[index[u]], geom_p0)
+        dist_to_v = scipy.spatial.distance.euclidean(positions[index[v]], geom_p0)
+        if dist_to_u <= dist_to_v:
+            starts.append(index[u])
+            ends.append(index[v])
+        else:
+            starts.append(index[v])
+            ends.append(index[u])
+        lengths.append(linelen)
+
+        # get evenly spaced points (skip first point at 0)
+        interp_dists = np.arange(0, linelen, interval)[1:]
+        counts.append(len(interp_dists))
+        for d in interp_dists:
+            dists.append(d)
+            xy_start.append(line.interpolate(d).coords[0][:2])
+            xy_end.append(line.interpolate(linelen - d).coords[0][:2])
+
+    samples = {
+        'index': index,
+        'positions': positions,
+        'starts': np.array(starts, dtype=int),
+        'ends': np.array(ends, dtype=int),
+        'lengths': np.array(lengths, dtype=float),
+        'offsets': np.concatenate(([0], np.cumsum(counts, dtype=int))),
+        'dists': np.array(dists, dtype=float),
+        'xy_start': np.array(xy_start, dtype=float).reshape(-1, 2),
+        'xy_end': np.array(xy_end, dtype=float).reshape(-1, 2),
+    }
+
+    # edges incident to every node (to collect the edges of reached nodes)
+    edges = np.arange(len(starts))
+    rows = np.concatenate((samples['starts'], samples['ends']))
+    order = np.argsort(rows, kind='stable')
+    samples['incident'] = np.concatenate((edges, edges))[order]
+    samples['incident_ptr'] = np.concatenate(
+        ([0], np.cumsum(np.bincount(rows, minlength=len(nodes)))))
+
+    return samples
+
+
+###############################################################################
+def holes_or_marbles_near_origin(samples, G_, origin_node, radius=150,
+                                 weight='length', csr_graph=None):
+    """
+    Select the nodes and precomputed points (see
+    precompute_holes_or_marbles()) within a network distance of radius from
+    the origin node.
+
+    Notes
+    -----
+    A single Dijkstra with cutoff radius yields the network distance of
+    every node near the origin (see apls_utils._nodes_near_origin_network(),
+    on csr_graph if given).  A point on an edge is reached through
+    either edge endpoint, and the points of an edge are taken radially
+    outward from the endpoint nearest to the origin (as
+    ensure_radial_linestrings() does).
+
+    Returns
+    -------
+    pos : np.array
+        Positions of the selected nodes and points, shape (n, 2).
+    """
+
+    node_names, node_dists = apls_utils._nodes_near_origin_network(
+        G_, origin_node, radius_m=radius, weight=weight, csr_graph=csr_graph)
+    return _samples_within_distances(samples, node_names, node_dists, radius)
+
+
+###############################################################################
+def _samples_within_distances(samples, node_names, node_dists, radius):
+    '''Positions of the nodes and precomputed points within radius, given
+    the network distance of every node near the origin'''
+
+    index = samples['index']
+    reached = np.array([index[n] for n in node_names], dtype=int)
+    dist = np.full(len(samples['positions']), np.inf)
+    dist[reached] = node_dists
+
+    # edges incident to reached nodes
+    ptr = samples['incident_ptr']
+    counts = ptr[reached + 1] - ptr[reached]
+    flat = np.repeat(ptr[reached] - np.cumsum(counts) + counts, counts) + \
+        np.arange(np.sum(counts))
+    edges = np.unique(samples['incident'][flat])
+
+    # points of these edges, from the endpoint nearest to the origin
+    offsets = samples['offsets']
+    counts = offsets[edges + 1] - offsets[edges]
+    flat = np.repeat(offsets[edges] - np.cumsum(counts) + counts, counts) + \
+        np.arange(np.sum(counts))
+    d_start = np.repeat(dist[samples['starts'][edges]], counts)
+    d_end = np.repeat(dist[samples['ends'][edges]], counts)
+    lengths = np.repeat(samples['lengths'][edges], counts)
+    from_start = d_start <= d_end
+    d = samples['dists'][flat]
+    network_dist = np.where(from_start,
+                            np.minimum(d_start + d, d_end + lengths - d),
+                            np.minimum(d_end + d, d_start + lengths - d))
+    xy = np.where(from_start[:, None], samples['xy_start'][flat],
+                  samples['xy_end'][flat])
+
+    return np.concatenate((samples['positions'][reached],
+                           xy[network_dist <= radius]))
+
+
+###############################################################################
+def match_marbles_to_holes(pos_p, pos_gt, hole_size=5, allow_multi_hole=False,
+                           matching='ordered'):
+    """
+    Match marbles (proposal points) to holes (ground truth points).
+
+    Notes
+    -----
+    All marble/hole pairs within ``hole_size`` are found at once with a
+    single ``sparse_distance_matrix`` query between two cKDTrees.
+    With ``allow_multi_hole`` every marble falls into its nearest hole.
+    Otherwise every hole takes at most one marble:
+        matching='greedy': Pairs are assigned by increasing distance
+            (ties broken by marble and then hole index), resolved in rounds
+            of mutually nearest pairs with array operations.
+        matching='ordered': Marbles are visited in order and fall into the
+            nearest hole not taken by a previous marble (the original,
+            order-dependent semantics).
+
+    Arguments
+    ---------
+    pos_p : np.array
+        Marble positions, shape (n_marbles, 2).
+    pos_gt : np.array
+        Hole positions, shape (n_holes, 2).
+    hole_size : float
+        Distance within which a marble falls into a hole. Defaults to ``5``.
+    allow_multi_hole : boolean
+        Allow multiple marbles in the same hole. Defaults to ``False``.
+    matching : str
+        Either ``'ordered'`` or ``'greedy'``. Defaults to ``'ordered'``.
+
+    Returns
+    -------
+    prop_tp, gt_tp, prop_fp : tuple
+        prop_tp is the array of matched marble indexes
+        gt_tp is the array of the hole index matched to every marble in prop_tp
+        prop_fp is the array of unmatched marble indexes
+    """
+
+    pos_p = np.asarray(pos_p, dtype=float).reshape(-1, 2)
+    pos_gt = np.asarray(pos_gt, dtype=float).reshape(-1, 2)
+    n_p, n_gt = len(pos_p), len(pos_gt)
+
+    if n_p == 0 or n_gt == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), \
+            np.arange(n_p)
+
+    # all marble/hole pairs within hole_size
+    pairs = scipy.spatial.cKDTree(pos_p).sparse_distance_matrix(
+        scipy.spatial.cKDTree(pos_gt), hole_size, output_type='ndarray')
+    m, h, d = pairs['i'].astype(int), pairs['j'].astype(int), pairs['v']
+
+    # candidates per marble, nearest first (ties by hole index)
+    order = np.lexsort((h, d, m))
+    m, h, d = m[order], h[order], d[order]
+
+    if allow_multi_hole:
+        first = np.ones(len(m), dtype=bool)
+        first[1:] = m[1:] != m[:-1]
+        prop_tp, gt_tp = m[first], h[first]
+
+    elif matching == 'ordered':
+        # visit marbles in order, take nearest hole not yet taken
+        taken = np.zeros(n_gt, dtype=bool)
+        starts = np.searchsorted(m, np.arange(n_p + 1))
+        prop_tp, gt_tp = [], []
+        for i in np.flatnonzero(np.diff(starts)):
+            holes = h[starts[i]:starts[i + 1]]
+            free = holes[~taken[holes]]
+            if len(free) > 0:
+                prop_tp.append(i)
+                gt_tp.append(free[0])
+                taken[free[0]] = True
+        prop_tp = np.asarray(prop_tp, dtype=int)
+        gt_tp = np.asarray(gt_tp, dtype=int)
+
+    elif matching == 'greedy':
+        # accept mutually nearest pairs, drop pairs with a matched marble
+        # or hole, repeat (the smallest remaining pair is always mutual)
+        prop_tp, gt_tp = [], []
+        while len(m) > 0:
+            best_h = np.full(n_p, -1)
+            first = np.ones(len(m), dtype=bool)
+            first[1:] = m[1:] != m[:-1]
+            best_h[m[first]] = h[first]
+            by_hole = np.lexsort((m, d, h))
+            first = np.ones(len(m), dtype=bool)
+            first[1:] = h[by_hole][1:] != h[by_hole][:-1]
+            best_m = np.full(n_gt, -1)
+            best_m[h[by_hole][first]] = m[by_hole][first]
+            mutual = (best_h[m] == h) & (best_m[h] == m)
+            prop_tp.append(m[mutual])
+            gt_tp.append(h[mutual])
+            keep = ~(np.isin(m, m[mutual]) | np.isin(h, h[mutual]))
+            m, h, d = m[keep], h[keep], d[keep]
+        prop_tp = np.concatenate(prop_tp) if prop_tp else np.zeros(0, int)
+        gt_tp = np.concatenate(gt_tp) if gt_tp else np.zeros(0, int)
+        order = np.argsort(prop_tp)
+        prop_tp, gt_tp = prop_tp[order], gt_tp[order]
+
+    else:
+        raise Exception("matching should be either 'greedy' or 'ordered'")
+
+    prop_fp = np.setdiff1d(np.arange(n_p), prop_tp)
+
+    return prop_tp, gt_tp, prop_fp
+
+
+###############################################################################
+def test_match_marbles_to_holes():
+    '''Compare both matchings against a brute-force reference'''
+
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        pos_p = rng.uniform(0, 40, (rng.integers(0, 20), 2))
+        pos_gt = rng.uniform(0, 40, (rng.integers(0, 20), 2))
+        dists = scipy.spatial.distance.cdist(pos_p, pos_gt).reshape(len(pos_p), len(pos_gt))
+
+        # ordered: marbles in order take the nearest free hole
+        taken, ordered = set(), set()
+        for i in range(len(pos_p)):
+            free = [j for j in np.argsort(dists[i], kind='stable')
+                    if dists[i, j] <= 5 and j not in taken]
+            if len(free) > 0:
+                taken.add(free[0])
+                ordered.add((i, free[0]))
+
+        # greedy: pairs by increasing distance
+        pairs = sorted((dists[i, j], i, j) for i in range(len(pos_p))
+                       for j in range(len(pos_gt)) if dists[i, j] <= 5)
+        used_p, used_gt, greedy = set(), set(), set()
+        for d, i, j in pairs:
+            if i not in used_p and j not in used_gt:
+                used_p.add(i)
+                used_gt.add(j)
+                greedy.add((i, j))
+
+        for matching, reference in [('ordered', ordered), ('greedy', greedy)]:
+            prop_tp, gt_tp, prop_fp = match_marbles_to_holes(
+                pos_p, pos_gt, hole_size=5, matching=matching)
+            assert set(zip(prop_tp.tolist(), gt_tp.tolist())) == reference
+            assert sorted(prop_tp.tolist() + prop_fp.tolist()) == list(range(len(pos_p)))
+
+
 ###############################################################################
 def compute_single_topo(G_sub_gt_, G_sub_p_,
                         x_coord='x', y_coord='y', hole_size=5,
-                        allow_multi_hole=False,
+                        allow_multi_hole=False, matching='ordered',
                         verbose=False, super_verbose=False):
     '''compute filled and empty holes for a single subgraph
-    By default, Only allow one marble in each hole (allow_multi_hole=False)'''
+    By default, Only allow one marble in each hole (allow_multi_hole=False)
+    Marbles are matched to holes all at once, see match_marbles_to_holes()
+    for the matching options'''
 
     # get node positions
     pos_gt = apls_utils._get_node_positions(G_sub_gt_, x_coord=x_coord,
@@ -599,51 +903,28 @@ def compute_single_topo(G_sub_gt_, G_sub_p_,
     pos_p = apls_utils._get_node_positions(G_sub_p_, x_coord=x_coord,
                                            y_coord=y_coord)
 
-    # construct kdtree of ground truth
-    kd_idx_dic0, kdtree0, pos_arr0 = apls_utils.G_to_kdtree(G_sub_gt_)
-
-    prop_tp, prop_fp = [], []
-    gt_tp, gt_fn = [], []
-    gt_match_idxs_set = set()   # set of already matched gt idxs
-    # iterate through marbles to see if it fall in a hole
-    for i, prop_point in enumerate(pos_p):
-        if verbose:
-            print(("prop i:", i, "prop node:", list(G_sub_p_.nodes())[i]))
-        # see if a marble is close to a hole
-        # dists, idxs = kdtree.query(prop_point, k=100,
-        #                           distance_upper_bount=hole_size)
-
-        idxs_raw = kdtree0.query_ball_point(prop_point, r=hole_size)
-        if not allow_multi_hole:
-            # subtract previously matched items from indices
-            idxs = list(set(idxs_raw) - gt_match_idxs_set)
-        else:
-            # allow multiple marbles to fall into the same hole
-            idxs = idxs_raw
+    return compute_single_topo_positions(
+        pos_gt, pos_p, hole_size=hole_size,
+        allow_multi_hole=allow_multi_hole, matching=matching,
+        verbose=verbose, super_verbose=super_verbose)
 
-        if super_verbose:
-            print(("idxs:", idxs))
-            print(("idxs_raw:", idxs_raw))
 
-        # if no results, add to false positive
-        if len(idxs) == 0:
-            prop_fp.append(i)
-
-        # otherwise, check what's close
-        else:
-
-            # check distances of remaining items
-            dists_m = np.asarray([scipy.spatial.distance.euclidean(
-                prop_point, [kdtree0.data[itmp][0], kdtree0.data[itmp][1]])
-                for itmp in idxs])
-            # get min distance
-            jmin = np.argmin(dists_m)
-            idx_min = idxs[jmin]
-
-            # add to true positive
-            prop_tp.append(i)
-            gt_tp.append(idx_min)
-            gt_match_idxs_set.add(idx_min)
+###############################################################################
+def compute_single_topo_positions(pos_gt, pos_p, hole_size=5,
+                                  allow_multi_hole=False, matching='ordered',
+                                  verbose=False, super_verbose=False):
+    '''compute filled and empty holes given hole positions (pos_gt) and
+    marble positions (pos_p), see compute_single_topo()'''
+
+    # match marbles to holes
+    prop_tp, gt_tp, prop_fp = match_marbles_to_holes(
+        pos_p, pos_gt, hole_size=hole_size,
+        allow_multi_hole=allow_multi_hole, matching=matching)
+    gt_match_idxs_set = set(gt_tp.tolist())
+
+    if super_verbose:
+        print(("prop_tp:", prop_tp))
+        print(("gt_tp:", gt_tp))
 
     # count up how many holes we've filled
     n_holes = len(pos_gt)
@@ -691,65 +972,35 @@ def compute_single_topo(G_sub_gt_, G_sub_p_,
 
 
 ###############################################################################
-def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
-                 n_measurement_nodes=10000, x_coord='x', y_coord='y',
-                 allow_multi_hole=False, prime=False,
-                 make_plots=False, verbose=False):
-    '''Compute topo metric
-     subgraph_radius = radius for topo computation
-     interval is spacing of inserted points
-     hole_size is the buffer within which proposals must fall
-     '''
-
-    t0 = time.time()
-    if (len(G_gt_) == 0) or (len(G_p_) == 0):
-        return 0, 0, 0, 0, 0, 0
-
-    if verbose:
-        print(("G_gt_.nodes():", G_gt_.nodes()))
-    # define ground truth kdtree
-    kd_idx_dic, kdtree, pos_arr = apls_utils.G_to_kdtree(G_gt_)
-    # proposal graph kdtree
-    kd_idx_dic_p, kdtree_p, pos_arr_p = apls_utils.G_to_kdtree(G_p_)
-
-    true_pos_count_l, false_pos_count_l, false_neg_count_l = [], [], []
-    # precision_l, recall_l, f1_l = [], [], []
-
-    samples_metadata = [] # Capture samples.
-
-    if not prime: # In case of normal we can deal with missing start or end nodes.
-        origin_nodes = G_gt_.nodes()
-    else: # In case of prime, we prefilter origin nodes which have a proposed node nearby.
-        origin_nodes = []
-        
-        for node in G_gt_.nodes():
-
-            n_props = G_gt_.nodes[node]
-            x0, y0 = n_props[x_coord], n_props[y_coord]
-            origin_point = [x0, y0]
-
-            node_names_p, idxs_refine_p, dists_m_refine_p = apls_utils._query_kd_ball(
-                kdtree_p, kd_idx_dic_p, origin_point, hole_size)
-
-            if len(node_names_p) > 0:
-                origin_nodes.append(node)
-    
-    # Make sure we don't pick more nodes than exist in the graph
-    n_pick = min(n_measurement_nodes, len(G_gt_.nodes()))
-    # Picking nodes.
-    origin_nodes = np.random.choice(origin_nodes, n_pick)
-
-    for i, origin_node in enumerate(origin_nodes):
-
-        if (i % 20) == 0:
-            print(i, "Origin node:", origin_node)
-        n_props = G_gt_.nodes[origin_node]
-        x0, y0 = n_props[x_coord], n_props[y_coord]
-        origin_point = [x0, y0]
+def _subgraph_with_holes_or_marbles(G_, origin_node, kdtree, kd_idx_dic,
+                                    subgraph_radius=150, interval=30,
+                                    x_coord='x', y_coord='y',
+                                    subgraph_distance='euclidean',
+                                    csr_graph=None, verbose=False):
+    '''Get the subgraph connected to origin_node within subgraph_radius,
+    and a copy of it with points inserted on the specified interval
+    subgraph_distance is either 'euclidean' (nodes in a kdtree ball, then
+    the component of the origin) or 'network' (nodes and inserted points
+    within subgraph_radius along the network, nodes are reached by a single
+    Dijkstra with cutoff, on csr_graph if given)'''
+
+    if subgraph_distance == 'network':
+        # all reached nodes connect to origin, also take the edges leaving
+        # the radius (their part within the radius gets points inserted)
+        node_names, node_dists = apls_utils._nodes_near_origin_network(
+            G_, origin_node,
+            radius_m=subgraph_radius,
+            csr_graph=csr_graph,
+            verbose=verbose)
+        G_sub1 = G_.subgraph(
+            set(node_names) | nx.node_boundary(G_, node_names))
+        if verbose:
+            print(("G_sub1.nodes():", G_sub1.nodes()))
 
+    else:
         # get subgraph
         node_names, node_dists = apls_utils._nodes_near_origin(
-            G_gt_, origin_node,
+            G_, origin_node,
             kdtree, kd_idx_dic,
             x_coord=x_coord, y_coord=y_coord,
             radius_m=subgraph_radius,
@@ -759,7 +1010,7 @@ def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
             print("subgraph empty")
 
         # get subgraph
-        G_sub0 = G_gt_.subgraph(node_names)
+        G_sub0 = G_.subgraph(node_names)
         if verbose:
             print(("G_sub0.nodes():", G_sub0.nodes()))
 
@@ -767,16 +1018,80 @@ def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
         node_names_conn = nx.node_connected_component(G_sub0, origin_node)
         G_sub1 = G_sub0.subgraph(node_names_conn)
 
-        # ensure linestrings are radially out from origin point
-        G_sub = ensure_radial_linestrings(G_sub1, origin_node,
-                                          x_coord='x', y_coord='y',
-                                          verbose=verbose)
+    # ensure linestrings are radially out from origin point
+    G_sub = ensure_radial_linestrings(G_sub1, origin_node,
+                                      x_coord='x', y_coord='y',
+                                      verbose=verbose)
+
+    # insert points
+    G_holes, xms, yms = insert_holes_or_marbles(
+        G_sub, origin_node,
+        interval=interval, n_id_add_val=1,
+        verbose=False)
+
+    if subgraph_distance == 'network':
+        # only keep nodes and inserted points within the network radius
+        # (inserted points split the edges, so they are nodes on the path)
+        node_names_holes, _ = apls_utils._nodes_near_origin_network(
+            G_holes, origin_node, radius_m=subgraph_radius)
+        G_holes = G_holes.subgraph(node_names_holes)
+
+    return G_sub, G_holes
+
 
-        # insert points
-        G_holes, xms, yms = insert_holes_or_marbles(
-            G_sub, origin_node,
-            interval=interval, n_id_add_val=1,
-            verbose=False)
+###############################################################################
+# State shared with the origin evaluation of compute_topo (inherited by forked
+# workers, rather than pickled per task)
+_topo_context = None
+
+
+###############################################################################
+def _compute_topo_origins(start, origin_nodes, make_plots=False):
+    '''Evaluate the topo metric at every origin node, given the state of
+    compute_topo (_topo_context).  start is the index of the first origin
+    node among all origin nodes
+    Return the true positive, false positive, false negative counts and f1
+    per origin node'''
+
+    G_gt_, G_p_ = _topo_context['G_gt_'], _topo_context['G_p_']
+    kdtree, kd_idx_dic = _topo_context['kdtree'], _topo_context['kd_idx_dic']
+    kdtree_p, kd_idx_dic_p = _topo_context['kdtree_p'], _topo_context['kd_idx_dic_p']
+    samples_gt, samples_p = _topo_context['samples_gt'], _topo_context['samples_p']
+    subgraph_radius = _topo_context['subgraph_radius']
+    interval = _topo_context['interval']
+    hole_size = _topo_context['hole_size']
+    x_coord, y_coord = _topo_context['x_coord'], _topo_context['y_coord']
+    allow_multi_hole = _topo_context['allow_multi_hole']
+    matching = _topo_context['matching']
+    sampling = _topo_context['sampling']
+    subgraph_distance = _topo_context['subgraph_distance']
+    csr_graph, csr_graph_p = _topo_context['csr_graph'], _topo_context['csr_graph_p']
+    verbose = _topo_context['verbose']
+
+    true_pos_count_l, false_pos_count_l, false_neg_count_l = [], [], []
+    samples_metadata = [] # Capture samples.
+
+    for i, origin_node in enumerate(origin_nodes, start):
+
+        if (i % 20) == 0:
+            print(i, "Origin node:", origin_node)
+        n_props = G_gt_.nodes[origin_node]
+        x0, y0 = n_props[x_coord], n_props[y_coord]
+        origin_point = [x0, y0]
+
+        if sampling == 'precomputed':
+            pos_gt = holes_or_marbles_near_origin(
+                samples_gt, G_gt_, origin_node, radius=subgraph_radius,
+                csr_graph=csr_graph)
+            n_holes = len(pos_gt)
+        else:
+            G_sub, G_holes = _subgraph_with_holes_or_marbles(
+                G_gt_, origin_node, kdtree, kd_idx_dic,
+                subgraph_radius=subgraph_radius, interval=interval,
+                x_coord=x_coord, y_coord=y_coord,
+                subgraph_distance=subgraph_distance, csr_graph=csr_graph,
+                verbose=verbose)
+            n_holes = len(G_holes.nodes())
 
         #####
         # Proposal
@@ -792,7 +1107,7 @@ def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
             # all nodes are false positives in this case
             true_pos_count_l.append(0)
             false_pos_count_l.append(0)
-            false_neg_count_l.append(len(G_holes.nodes()))
+            false_neg_count_l.append(n_holes)
             samples_metadata.append(0)
             continue
 
@@ -804,43 +1119,30 @@ def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
         if verbose:
             print(("origin_node_p:", origin_node_p))
 
-        # get subgraph
-        node_names_p, node_dists_p = apls_utils._nodes_near_origin(
-            G_p_, origin_node_p,
-            kdtree_p, kd_idx_dic_p,
-            x_coord=x_coord, y_coord=y_coord,
-            radius_m=subgraph_radius,
-            verbose=verbose)
-
-        # get subgraph
-        G_sub0_p = G_p_.subgraph(node_names_p)
-        if verbose:
-            print(("G_sub0_p.nodes():", G_sub0_p.nodes()))
-
-        # make sure all nodes connect to origin
-        node_names_conn_p = nx.node_connected_component(
-            G_sub0_p, origin_node_p)
-        G_sub1_p = G_sub0_p.subgraph(node_names_conn_p)
-
-        # ensure linestrings are radially out from origin point
-        G_sub_p = ensure_radial_linestrings(G_sub1_p, origin_node_p,
-                                            x_coord='x', y_coord='y',
-                                            verbose=verbose)
-
-        # insert points
-        G_holes_p, xms, yms = insert_holes_or_marbles(
-            G_sub_p, origin_node_p,
-            interval=interval, n_id_add_val=1,
-            verbose=False)
-
         ####################
         # compute topo metric
-        true_pos_count, false_pos_count, false_neg_count, \
-            precision, recall, f1 = compute_single_topo(
-                G_holes, G_holes_p,
+        if sampling == 'precomputed':
+            pos_p = holes_or_marbles_near_origin(
+                samples_p, G_p_, origin_node_p, radius=subgraph_radius,
+                csr_graph=csr_graph_p)
+            true_pos_count, false_pos_count, false_neg_count, \
+                precision, recall, f1 = compute_single_topo_positions(
+                    pos_gt, pos_p,
+                    allow_multi_hole=allow_multi_hole, matching=matching,
+                    hole_size=hole_size, verbose=verbose)
+        else:
+            G_sub_p, G_holes_p = _subgraph_with_holes_or_marbles(
+                G_p_, origin_node_p, kdtree_p, kd_idx_dic_p,
+                subgraph_radius=subgraph_radius, interval=interval,
                 x_coord=x_coord, y_coord=y_coord,
-                allow_multi_hole=allow_multi_hole,
-                hole_size=hole_size, verbose=verbose)
+                subgraph_distance=subgraph_distance, csr_graph=csr_graph_p,
+                verbose=verbose)
+            true_pos_count, false_pos_count, false_neg_count, \
+                precision, recall, f1 = compute_single_topo(
+                    G_holes, G_holes_p,
+                    x_coord=x_coord, y_coord=y_coord,
+                    allow_multi_hole=allow_multi_hole, matching=matching,
+                    hole_size=hole_size, verbose=verbose)
         true_pos_count_l.append(true_pos_count)
         false_pos_count_l.append(false_pos_count)
         false_neg_count_l.append(false_neg_count)
@@ -848,7 +1150,7 @@ def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
         samples_metadata.append(f1)
 
         # plot if i == 0:
-        if i == 0 and make_plots:
+        if i == 0 and make_plots and sampling == 'insert':
             # plot G_gt_
             plt.close('all')
             # plot initial graph
@@ -940,6 +1242,130 @@ def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
                 G_holes_p, ax, fontsize=9)  # node ids
             plt.close('all')
 
+    return true_pos_count_l, false_pos_count_l, false_neg_count_l, \
+        samples_metadata
+
+
+###############################################################################
+def compute_topo(G_gt_, G_p_, subgraph_radius=150, interval=30, hole_size=5,
+                 n_measurement_nodes=10000, x_coord='x', y_coord='y',
+                 allow_multi_hole=False, prime=False,
+                 make_plots=False, verbose=False, matching='ordered',
+                 sampling='insert', subgraph_distance='euclidean', csr=False,
+                 workers=1):
+    '''Compute topo metric
+     subgraph_radius = radius for topo computation
+     interval is spacing of inserted points
+     hole_size is the buffer within which proposals must fall
+     matching is the marble/hole matching, see match_marbles_to_holes()
+     sampling is either 'insert' (insert points into a copy of the subgraph
+       around every origin) or 'precomputed' (sample points on all edges
+       once, and select the points within subgraph_radius network distance
+       of every origin, see holes_or_marbles_near_origin())
+     subgraph_distance is either 'euclidean' (nodes within subgraph_radius
+       of the origin) or 'network' (nodes within subgraph_radius along the
+       network, by a single Dijkstra with cutoff) for sampling='insert',
+       sampling='precomputed' always uses network distance
+     csr searches the network distance on sparse (CSR) adjacency matrices of
+       the graphs, see apls_utils.G_to_csr()
+     workers is the number of processes to distribute origin nodes over
+       (plots are only made with a single worker)
+     '''
+
+    t0 = time.time()
+    if (len(G_gt_) == 0) or (len(G_p_) == 0):
+        return 0, 0, 0, 0, 0, 0
+
+    if verbose:
+        print(("G_gt_.nodes():", G_gt_.nodes()))
+    # define ground truth kdtree
+    kd_idx_dic, kdtree, pos_arr = apls_utils.G_to_kdtree(G_gt_)
+    # proposal graph kdtree
+    kd_idx_dic_p, kdtree_p, pos_arr_p = apls_utils.G_to_kdtree(G_p_)
+
+    if sampling == 'precomputed':
+        samples_gt = precompute_holes_or_marbles(
+            G_gt_, interval=interval, x_coord=x_coord, y_coord=y_coord)
+        samples_p = precompute_holes_or_marbles(
+            G_p_, interval=interval, x_coord=x_coord, y_coord=y_coord)
+    elif sampling == 'insert':
+        samples_gt, samples_p = None, None
+    else:
+        raise Exception("sampling should be either 'insert' or 'precomputed'")
+
+    if subgraph_distance not in ['euclidean', 'network']:
+        raise Exception("subgraph_distance should be either 'euclidean' or 'network'")
+
+    if csr:
+        csr_graph = apls_utils.G_to_csr(G_gt_)
+        csr_graph_p = apls_utils.G_to_csr(G_p_)
+    else:
+        csr_graph, csr_graph_p = None, None
+
+    true_pos_count_l, false_pos_count_l, false_neg_count_l = [], [], []
+    # precision_l, recall_l, f1_l = [], [], []
+
+    samples_metadata = [] # Capture samples.
+
+    if not prime: # In case of normal we can deal with missing start or end nodes.
+        origin_nodes = G_gt_.nodes()
+    else: # In case of prime, we prefilter origin nodes which have a proposed node nearby.
+        origin_nodes = []
+        
+        for node in G_gt_.nodes():
+
+            n_props = G_gt_.nodes[node]
+            x0, y0 = n_props[x_coord], n_props[y_coord]
+            origin_point = [x0, y0]
+
+            node_names_p, idxs_refine_p, dists_m_refine_p = apls_utils._query_kd_ball(
+                kdtree_p, kd_idx_dic_p, origin_point, hole_size)
+
+            if len(node_names_p) > 0:
+                origin_nodes.append(node)
+    
+    # Make sure we don't pick more nodes than exist in the graph
+    n_pick = min(n_measurement_nodes, len(G_gt_.nodes()))
+    # Picking nodes.
+    origin_nodes = np.random.choice(origin_nodes, n_pick)
+
+    # Evaluate origin nodes.  The origin nodes are picked above, evaluating
+    # an origin node involves no randomness, so scores are identical
+    # regardless of the number of workers.
+    global _topo_context
+    _topo_context = {
+        'G_gt_': G_gt_, 'G_p_': G_p_,
+        'kdtree': kdtree, 'kd_idx_dic': kd_idx_dic,
+        'kdtree_p': kdtree_p, 'kd_idx_dic_p': kd_idx_dic_p,
+        'samples_gt': samples_gt, 'samples_p': samples_p,
+        'subgraph_radius': subgraph_radius, 'interval': interval,
+        'hole_size': hole_size, 'x_coord': x_coord, 'y_coord': y_coord,
+        'allow_multi_hole': allow_multi_hole, 'matching': matching,
+        'sampling': sampling, 'subgraph_distance': subgraph_distance,
+        'csr_graph': csr_graph, 'csr_graph_p': csr_graph_p,
+        'verbose': verbose}
+    try:
+        if workers > 1 and len(origin_nodes) > 1:
+            # contiguous chunks of origin nodes, so results concatenate in
+            # origin order, workers inherit _topo_context by forking
+            chunks = [chunk for chunk in np.array_split(
+                np.arange(len(origin_nodes)), workers) if len(chunk) > 0]
+            with multiprocessing.get_context('fork').Pool(len(chunks)) as pool:
+                results = pool.starmap(
+                    _compute_topo_origins,
+                    [(chunk[0], list(origin_nodes[chunk])) for chunk in chunks])
+        else:
+            results = [_compute_topo_origins(0, origin_nodes,
+                                             make_plots=make_plots)]
+    finally:
+        _topo_context = None
+
+    for true_pos_counts, false_pos_counts, false_neg_counts, f1s in results:
+        true_pos_count_l.extend(true_pos_counts)
+        false_pos_count_l.extend(false_pos_counts)
+        false_neg_count_l.extend(false_neg_counts)
+        samples_metadata.extend(f1s)
+
     # compute total score
     tp_tot = np.sum(true_pos_count_l)
     fp_tot = np.sum(false_pos_count_l)
@@ -1,5 +1,6 @@
 from external import * 
 from graph_node_extraction import *
+from coordinates import *
 
 #######################################
 ### Printing stuff with decorators.
@@ -54,32 +55,149 @@ def logger(*args):
 
 ### R-Tree
 
+# Construct (bulk-loaded) R-Tree from an array of integer identifiers and arrays of minimal and maximal (y, x) bounding box corners.
+# * Bulk loading packs the tree (Sort-Tile-Recursive), which is both faster to construct and to query than inserting one by one.
+def bboxs_to_rtree(ids, mins, maxs):
+
+    if len(ids) == 0:
+        return rtree.index.Index()
+
+    ids  = np.ascontiguousarray(ids, dtype=np.int64)
+    mins = np.ascontiguousarray(mins, dtype=np.float64).reshape(-1, 2)
+    maxs = np.ascontiguousarray(maxs, dtype=np.float64).reshape(-1, 2)
+
+    return rtree.index.Index((ids, mins, maxs))
+
+
+# R-Tree on graph edges.
+# * Edges are stored under an integer identifier, `eids` links the integer identifier to the edge identifier (and `ids` vice versa).
+# * Inserting, deleting and querying acts on edge identifiers, use `intersection_v` and `eids` for (raw) batch queries.
+# * The bounding box of every edge is kept, so deleting does not require the exact bounding box of the edge.
+class EdgeRtree(rtree.index.Index):
+
+    def __init__(self, eids, mins, maxs):
+        self.eids  = list(eids)
+        self.ids   = {eid: i for i, eid in enumerate(self.eids)}
+        if len(self.eids) == 0:
+            self.bboxs = []
+            super().__init__()
+        else:
+            ids  = np.arange(len(self.eids), dtype=np.int64)
+            mins = np.ascontiguousarray(mins, dtype=np.float64).reshape(-1, 2)
+            maxs = np.ascontiguousarray(maxs, dtype=np.float64).reshape(-1, 2)
+            self.bboxs = [tuple(bbox) for bbox in np.hstack((mins, maxs)).tolist()]
+            super().__init__((ids, mins, maxs))
+
+    # Integer identifier of edge (a new one is assigned on an unseen edge).
+    def edge_id(self, eid):
+        if eid not in self.ids:
+            self.ids[eid] = len(self.eids)
+            self.eids.append(eid)
+            self.bboxs.append(None)
+        return self.ids[eid]
+
+    def insert(self, eid, coordinates, obj=None):
+        i = self.edge_id(eid)
+        self.bboxs[i] = tuple(coordinates)
+        super().insert(i, coordinates)
+
+    def delete(self, eid, coordinates=None):
+        i = self.ids[eid]
+        if self.bboxs[i] != None: # (Edge is not deleted yet.)
+            super().delete(i, self.bboxs[i])
+            self.bboxs[i] = None
+
+    def intersection(self, coordinates, objects=False):
+        return (self.eids[i] for i in super().intersection(coordinates))
+
+    def nearest(self, coordinates, num_results=1, objects=False):
+        return (self.eids[i] for i in super().nearest(coordinates, num_results=num_results))
+
+
 # Construct R-Tree on graph nodes.
 def graphnodes_to_rtree(G):
 
-    tree = rtree.index.Index()
-
-    for nid, attrs in iterate_nodes(G):
-        y, x = attrs['y'], attrs['x']
-        tree.insert(nid, (y, x, y, x))
+    nids, positions = graphnodes_to_arrays(G)
 
-    return tree
+    return bboxs_to_rtree(nids, positions, positions)
 
 
 # Construct R-Tree on graph edges.
 def graphedges_to_rtree(G):
 
-    tree = rtree.index.RtreeContainer()
-
-    for eid, attrs in iterate_edges(G):
-        curvature = attrs["curvature"]
-        miny = min(curvature[:,0])
-        maxy = max(curvature[:,0])
-        minx = min(curvature[:,1])
-        maxx = max(curvature[:,1])
-        tree.insert(eid, (miny, minx, maxy, maxx))
-
-    return tree
+    eids, mins, maxs = graphedges_to_bbox_arrays(G)
+
+    return EdgeRtree(eids, mins, maxs)
+
+
+## Spatial index cached per graph.
+# * Node and edge R-Trees are constructed once per graph and reused by subsequent calls.
+# * Graph mutations have to be reported (`spatial_index_add_node`, `spatial_index_add_edge`, `spatial_index_remove_edge`, ...) to keep the trees up to date.
+#   (Edge cutting with `graph_cut_edge_subcurves` takes care of this.)
+# * As a safeguard, the trees are reconstructed if the number of nodes or edges of the graph does not match with the trees.
+#   (Thereby networkx mutations which skip the hooks above, e.g. `G.remove_edge`, do not leave the trees stale.)
+# * Geometry mutations keep the number of nodes and edges (moving a node, replacing the curvature of an edge), so they are not detected:
+#   Any such mutation has to call `drop_spatial_index` (or remove and re-add the edge with the hooks above). Reversing curvature keeps the bounding box, so needs nothing.
+spatial_indices = weakref.WeakKeyDictionary()
+
+# Obtain (cached) spatial index of a graph.
+def graph_spatial_index(G):
+    index = spatial_indices.get(G)
+    if index == None or index["nodes"] != len(G.nodes()) or index["edges"] != G.number_of_edges():
+        index = {"node_tree": graphnodes_to_rtree(G), "edge_tree": graphedges_to_rtree(G), "nodes": len(G.nodes()), "edges": G.number_of_edges()}
+        spatial_indices[G] = index
+    return index
+
+# Obtain (cached) R-Tree on graph nodes.
+graph_node_rtree = lambda G: graph_spatial_index(G)["node_tree"]
+
+# Obtain (cached) R-Tree on graph edges.
+graph_edge_rtree = lambda G: graph_spatial_index(G)["edge_tree"]
+
+# Drop cached spatial index of a graph (e.g. after mutating the graph structure directly, or after moving nodes or replacing edge curvature).
+def drop_spatial_index(G):
+    spatial_indices.pop(G, None)
+
+# Update cached spatial index (if any) with node added to the graph.
+def spatial_index_add_node(G, nid):
+    if G in spatial_indices:
+        index = spatial_indices[G]
+        add_rtree_bbox(index["node_tree"], graphnode_to_bbox(G, nid), nid)
+        index["nodes"] += 1
+
+# Update cached spatial index (if any) before removing node from the graph.
+def spatial_index_remove_node(G, nid):
+    if G in spatial_indices:
+        index = spatial_indices[G]
+        index["node_tree"].delete(nid, flatten_bbox(graphnode_to_bbox(G, nid)))
+        index["nodes"] -= 1
+
+# Update cached spatial index (if any) with edge added to the graph.
+def spatial_index_add_edge(G, eid):
+    if G in spatial_indices:
+        index = spatial_indices[G]
+        eid = format_eid(G, eid)
+        add_rtree_bbox(index["edge_tree"], graphedge_to_bbox(G, eid), eid)
+        index["edges"] += 1
+
+# Update cached spatial index (if any) with edge removed from the graph.
+def spatial_index_remove_edge(G, eid):
+    if G in spatial_indices:
+        index = spatial_indices[G]
+        eid = format_eid(G, eid)
+        edge_tree = index["edge_tree"]
+        if eid in edge_tree.ids and edge_tree.bboxs[edge_tree.ids[eid]] != None:
+            edge_tree.delete(eid)
+            index["edges"] -= 1
+
+
+# Construct R-Tree on line segments (provided as arrays of start and endpoints), identified by their index.
+def linesegments_to_rtree(ps, qs):
+
+    mins = np.minimum(ps, qs)
+    maxs = np.maximum(ps, qs)
+
+    return bboxs_to_rtree(np.arange(len(ps)), mins, maxs)
 
 
 ### Bounding boxes
@@ -98,6 +216,31 @@ def graphedge_to_bbox(G, eid, padding=0):
     bbox = array([(miny, minx), (maxy, maxx)])
     return pad_bounding_box(bbox, padding)
 
+# Node identifiers and (y, x) positions as arrays.
+def graphnodes_to_arrays(G):
+    nids = np.fromiter(G.nodes(), dtype=np.int64, count=len(G.nodes()))
+    positions = array([(G._node[nid]['y'], G._node[nid]['x']) for nid in nids.tolist()], dtype=np.float64).reshape(-1, 2)
+    return nids, positions
+
+# Curvature of all edges as a single (flat) buffer, edge `i` has curvature `curvature[offsets[i]:offsets[i+1]]`.
+def graphedges_to_curvature_arrays(G):
+    eids, curves = [], []
+    for eid, attrs in iterate_edges(G):
+        eids.append(eid)
+        curves.append(np.asarray(attrs["curvature"], dtype=np.float64).reshape(-1, 2))
+    offsets = np.concatenate(([0], np.cumsum([len(ps) for ps in curves], dtype=np.int64)))
+    curvature = np.concatenate(curves) if len(curves) > 0 else np.zeros((0, 2))
+    return eids, curvature, offsets
+
+# Edge identifiers with minimal and maximal (y, x) bounding box corners of their curvature as arrays.
+def graphedges_to_bbox_arrays(G):
+    eids, curvature, offsets = graphedges_to_curvature_arrays(G)
+    if len(eids) == 0:
+        return eids, np.zeros((0, 2)), np.zeros((0, 2))
+    mins = np.minimum.reduceat(curvature, offsets[:-1], axis=0)
+    maxs = np.maximum.reduceat(curvature, offsets[:-1], axis=0)
+    return eids, mins, maxs
+
 # Construct dictionary that links edge id to a bounding box.
 # Note: Padding has to be added manually afterwards if needed.
 def graphedges_to_bboxs(G, padding=0):
@@ -174,8 +317,8 @@ def curve_cut_intervals(ps, intervals):
     if intervals[0] < 0.00001:
         intervals = intervals[1:]
 
-    if intervals[-1] < 1 - 0.00001:
-        intervals = intervals[:1]
+    if intervals[-1] > 1 - 0.00001:
+        intervals = intervals[:-1]
 
     check(intervals[0] > 0.00001     , expect="Expect first interval to be greater than 0.0001.")
     check(intervals[-1] < 1 - 0.00001, expect="Expect final interval to be less than 0.9999.")
@@ -346,12 +489,31 @@ def test_curve_cut_max_distance():
 
 ## Linestring and curves.
 
-# Convert an array into a LineString consisting of Points.
-to_linestring   = lambda curvature: LineString([Point(x, y) for y, x in curvature]) # Coordinates are flipped.
+# Convert an array into a LineString (built directly from the coordinate array).
+to_linestring   = lambda curvature: LineString(np.asarray(curvature, dtype=np.float64)[:, ::-1]) # Coordinates are flipped.
 
 # Convert a LineString into an array.
 from_linestring = lambda geometry : array([(y, x) for x, y in geometry.coords]) # Coordinates are flipped.
 
+# Obtain edge geometry from edge attributes.
+# * Geometry is derived from the curvature on first access and cached in the attributes.
+# * The cached geometry is derived again once the curvature got replaced (tracked by `geometry_curvature`).
+def attributes_geometry(attrs):
+    if "curvature" not in attrs:
+        return attrs["geometry"]
+    if "geometry" not in attrs or attrs.get("geometry_curvature") is not attrs["curvature"]:
+        attrs["geometry"] = to_linestring(attrs["curvature"])
+        attrs["geometry_curvature"] = attrs["curvature"]
+    return attrs["geometry"]
+
+# Obtain edge geometry.
+def edge_geometry(G, eid):
+    return attributes_geometry(get_edge_attributes(G, eid))
+
+# Edge attributes without (cached) geometry, to construct attributes of edges with new curvature.
+def attributes_without_geometry(attrs):
+    return {key: value for key, value in attrs.items() if key not in ["geometry", "geometry_curvature"]}
+
 
 ### Partial curve matching logic
 
@@ -365,21 +527,27 @@ def curve_to_vector_list(ps):
 
 # Convert a nx.T2 into a graph structure used by the partial curve matching algorithm.
 def graph_to_rust_graph(G):
+    return rust_graph_data_to_rust_graph(graph_to_rust_graph_data(G))
 
-    assert type(G) == nx.Graph
 
-    # Extract node data as Vectors from the graph.
-    def extract_nodes_list(G):
-        l = []
-        for nid, data in G.nodes(data = True):
-            l.append((nid, Vector(data['y'], data['x'])))
-        return l
+# Extract the (picklable) node positions and edge identifiers a rust graph is constructed from.
+# * Allows to construct the rust graph in another process.
+def graph_to_rust_graph_data(G):
 
-    # Extract vertices as Vec<(NID, Vector)>.
-    vertices = extract_nodes_list(G)
-    # Extract edges as Vec<(NID, NID)>.
+    assert type(G) == nx.Graph
+
+    # Extract vertices as `[(nid, (y, x))]`.
+    vertices = [(nid, (data['y'], data['x'])) for nid, data in G.nodes(data = True)]
+    # Extract edges as `[(nid, nid)]`.
     eids = [eid for eid, _ in iterate_edges(G)]
-    return make_graph(vertices, eids)
+    return vertices, eids
+
+
+# Construct the rust graph out of node positions and edge identifiers.
+def rust_graph_data_to_rust_graph(data):
+    vertices, eids = data
+    # Vertices as Vec<(NID, Vector)>, edges as Vec<(NID, NID)>.
+    return make_graph([(nid, Vector(y, x)) for nid, (y, x) in vertices], eids)
 
 # Compute partial curve matching between curve ps and some subcurve of qs within eps distance threshold.
 # If convert is true automatically convert input curves into vector lists.
@@ -533,6 +701,99 @@ def graph_length(G):
     return sum([curve_length(attrs["curvature"]) for eid, attrs in iterate_edges(G)])
 
 
+# Convert graph into a (symmetric) sparse adjacency matrix in CSR format weighted by an edge attribute.
+# * Returns the matrix alongside the node identifiers (index in the matrix to nid).
+# * Multi-edges are reduced to the edge of lowest weight, self-loops are dropped.
+def graph_to_csr_matrix(G, weight="length"):
+
+    nids = get_nids(G)
+    nid_to_index = {nid: i for i, nid in enumerate(nids)}
+
+    rows, cols, weights = [], [], []
+    for (u, v, *_), attrs in iterate_edges(G):
+        if u != v:
+            rows.append(nid_to_index[u])
+            cols.append(nid_to_index[v])
+            weights.append(attrs[weight])
+
+    # Both directions.
+    rows, cols = array(rows + cols, dtype=int), array(cols + rows, dtype=int)
+    weights = array(weights + weights, dtype=float)
+
+    # Only retain lowest weight per `(row, col)` pair (the CSR constructor would sum duplicated entries).
+    order = np.lexsort((weights, cols, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+
+    matrix = csr_matrix((weights[first], (rows[first], cols[first])), shape=(len(nids), len(nids)))
+
+    return matrix, nids
+
+
+## Graph ownership.
+# Transforms act on a copy of their input graph by default. With `inplace=True` the caller passes ownership of the graph to the transform, which then mutates (and returns) it directly.
+# Chained transforms thus only have to copy once: `simplify_graph(graph_deduplicate(G), inplace=True)`.
+
+# Graphs owned by a caller (which transforms are not allowed to take ownership of), alongside their fingerprint (only recorded with full validation).
+protected_graphs = weakref.WeakKeyDictionary()
+
+
+# Fingerprint of graph data (graph attributes, nodes and edges with their attributes), to detect mutation.
+# * Edge geometry is derived from curvature, so only the curvature is hashed (by its bytes).
+def graph_fingerprint(G):
+
+    digest = hashlib.sha256()
+    digest.update(repr(sorted(G.graph.items(), key=lambda item: item[0])).encode())
+
+    for nid, attrs in iterate_nodes(G):
+        digest.update(repr((nid, sorted(attrs.items(), key=lambda item: item[0]))).encode())
+
+    for eid, attrs in iterate_edges(G):
+        digest.update(repr((eid, sorted([(key, value) for key, value in attrs.items() if key not in ["curvature", "geometry", "geometry_curvature"]], key=lambda item: item[0]))).encode())
+        if "curvature" in attrs:
+            digest.update(np.ascontiguousarray(attrs["curvature"], dtype=np.float64).tobytes())
+
+    return digest.hexdigest()
+
+
+# Mark graph as owned by the caller: Transforms are not allowed to mutate it.
+# * With full validation a fingerprint is recorded, so accidental mutation is detected (see `sanity_check_protected_graph`).
+def protect_graph(G):
+    protected_graphs[G] = graph_fingerprint(G) if validate("full") else None
+    return G
+
+
+# Release graph from protection (for example to pass ownership of it to a transform afterwards).
+def unprotect_graph(G):
+    protected_graphs.pop(G, None)
+    return G
+
+
+# Sanity check a protected graph has not been mutated since it got protected.
+# * Fingerprinting costs about as much as copying the graph, so call this at the protection boundary (e.g. after a pipeline stage), not per transform.
+def sanity_check_protected_graph(G):
+
+    if not validate("full"):
+        return
+
+    fingerprint = protected_graphs.get(G)
+    if fingerprint != None:
+        check(graph_fingerprint(G) == fingerprint, expect="Expect caller-owned graph to be left untouched by transforms.")
+
+
+# Obtain the graph for a transform to act on: The graph itself (`inplace`, ownership is passed to the transform) or a copy of it.
+# * Only rejects taking ownership of a protected graph (constant cost), mutation of protected graphs is detected by `sanity_check_protected_graph`.
+def graph_to_transform(G, inplace=False):
+
+    if not inplace:
+        return G.copy()
+
+    check(G not in protected_graphs, expect="Expect not to transform a caller-owned (protected) graph in place.")
+
+    return G
+
+
 ## Curve-point related logic.
 
 # Rotating (x, y)
@@ -547,56 +808,113 @@ def rotate(a):
 # * Assume as arrays.
 # * Linesegment p, q
 # * Point a
-# * All input points are `(y, x)`, but we compute on `(x, y)`.
 def distance_point_to_linesegment(p, q, a):
 
-    # Flip coordinates around from `(y, x)` to `(x, y)`.
-    flip = lambda _x: array([_x[1], _x[0]])
+    distances, intervals, _ = project_points_onto_linesegments(array([a], dtype=np.float64), array([p], dtype=np.float64), array([q], dtype=np.float64))
 
-    # Act on x, y
-    p = flip(p)
-    q = flip(q)
-    a = flip(a)
+    return distances[0], intervals[0]
 
-    # Translate p to the origin.
-    q = q - p
-    a = a - p
 
-    # Rotate a and q around p (and thereby the origin) in such that q lies horizontally to the right.
-    rotation = -atan2(q[1], q[0])  # Find rotation (take orientation of q).
-    q = rotate(rotation).dot(q)
-    a = rotate(rotation).dot(a)
-    assert abs(q[1]) < 0.0001
+# Compute position on curve which lies nearest to a point.
+def nearest_position_and_interval_on_curve_to_point(ps, point): 
 
-    # Decide on orthogonality.
-    if a[0] < 0: # Point is on the left side of the origin.
-        return norm(a), 0 # Distance from point to startpoint linesegment, start of interval.
-    elif a[0] > q[0]: # Point is to the right of the endpoint linesegment.
-        return norm(q - a), 1  # Distance from point to end linesegment, end of interval.
-    else: # Distance from point y coordinate to x axis (where y equals 0), relative x coordinate to end of line segment.
-        return a[1], a[0] / q[0]
+    ps = np.asarray(ps, dtype=np.float64)
+    positions, intervals, _ = project_points_onto_curves(array([point], dtype=np.float64), ps, array([0, len(ps)]))
 
+    return positions[0], intervals[0]
 
-# Compute position on curve which lies nearest to a point.
-def nearest_position_and_interval_on_curve_to_point(ps, point): 
-    
-    items = []
-    for i, linesegment in enumerate(zip(ps,ps[1:])):
-        p, q = linesegment
-        distance, interval = distance_point_to_linesegment(p, q, point)
-        items.append((i, distance, interval))
-
-    # Seek lowest distance.
-    i, distance, interval = min(items, key=lambda x: x[1])
-    position = ps[i] * (1 - interval) + ps[i + 1] * interval
-
-    # Compute interval along curve.
-    lengths    = norm(ps[1:] - ps[:-1], axis=1)
-    weights    = lengths / np.sum(lengths)
-    cumulative = np.hstack(([0], np.cumsum(weights)))
-    actual_interval = cumulative[i] + interval * weights[i]
+# Project points onto line-segments `p-q` (row by row, thus all inputs are `(n, 2)` arrays).
+# * Returns the distance, the interval along the line-segment and the position of the nearest point on the line-segment.
+def project_points_onto_linesegments(points, ps, qs):
+
+    directions = qs - ps
+    squared_lengths = np.sum(directions * directions, axis=1)
+
+    # Degenerate (zero-length) line-segments project onto their startpoint.
+    squared_lengths = np.where(squared_lengths > 0, squared_lengths, 1)
+
+    intervals = np.clip(np.sum((points - ps) * directions, axis=1) / squared_lengths, 0, 1)
+    positions = ps + intervals[:, None] * directions
+    distances = norm(points - positions, axis=1)
+
+    return distances, intervals, positions
+
+
+# Project points onto curves, all curves are provided as a single curvature buffer with offsets (curve `i` is `curvature[offsets[i]:offsets[i+1]]`).
+# * Every point `points[i]` is projected onto curve `curves[i]` (by default the curve with the same index).
+#   (Use `np.repeat`/`np.tile` on points and curves to project one point onto many curves or many points onto one curve.)
+# * Returns the nearest position on the curve, its interval along the curve (in `[0, 1]`) and its distance to the point.
+# * On equal distance the first line-segment along the curve is taken.
+def project_points_onto_curves(points, curvature, offsets, curves=None):
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets)
+    if curves is None:
+        curves = np.arange(len(points))
+    curves = np.asarray(curves, dtype=np.int64)
+
+    if len(points) == 0:
+        return np.zeros((0, 2)), np.zeros(0), np.zeros(0)
+
+    # Line-segments of every point-curve pair.
+    starts = offsets[curves]
+    counts = offsets[curves + 1] - starts - 1
+    check(np.all(counts > 0), expect="Expect every curve to consist of at least two points.")
+    pairs = np.repeat(np.arange(len(points)), counts)
+    pair_starts = np.cumsum(counts) - counts
+    segments = starts[pairs] + (np.arange(len(pairs)) - pair_starts[pairs]) # Index of line-segment startpoint in the curvature buffer.
+
+    ps = curvature[segments]
+    qs = curvature[segments + 1]
+    distances, intervals, positions = project_points_onto_linesegments(points[pairs], ps, qs)
+
+    # Interval along the curve (fraction of curve length up to the projected position).
+    lengths = norm(qs - ps, axis=1)
+    before = np.cumsum(lengths) - lengths
+    before = before - before[pair_starts][pairs] # Curve length up to the start of the line-segment.
+    totals = np.add.reduceat(lengths, pair_starts)
+    totals = np.where(totals > 0, totals, 1)
+    curve_intervals = (before + intervals * lengths) / totals[pairs]
+
+    # Nearest line-segment per pair (first line-segment on equal distance).
+    order = np.lexsort((np.arange(len(pairs)), distances, pairs))
+    nearest = order[pair_starts]
+
+    return positions[nearest], curve_intervals[nearest], distances[nearest]
+
+
+# Pack the line-segments of all edge curvatures of G into flat arrays.
+# * `eids`: Edge identifiers, `edge`: Index (into `eids`) of the edge the line-segment belongs to.
+# * `p`, `q`: Start and endpoint of every line-segment.
+# * `start`, `weight`: Interval along the edge curvature at which the line-segment starts and the interval it spans.
+def graph_linesegments_to_arrays(G):
+
+    eids, edges, ps, qs, starts, weights = [], [], [], [], [], []
+
+    for i, (eid, attrs) in enumerate(iterate_edges(G)):
+        curve      = attrs["curvature"]
+        lengths    = norm(curve[1:] - curve[:-1], axis=1)
+        total      = np.sum(lengths)
+        fractions  = lengths / (total if total > 0 else 1) # (A zero-length curve has all its line segments at interval 0.)
+        eids.append(eid)
+        edges.append(np.full(len(lengths), i))
+        ps.append(curve[:-1])
+        qs.append(curve[1:])
+        starts.append(np.hstack(([0], np.cumsum(fractions)[:-1])))
+        weights.append(fractions)
+
+    if len(eids) == 0:
+        return {"eids": [], "edge": np.zeros(0, dtype=int), "p": np.zeros((0, 2)), "q": np.zeros((0, 2)), "start": np.zeros(0), "weight": np.zeros(0)}
+
+    return {
+        "eids"  : eids,
+        "edge"  : np.concatenate(edges),
+        "p"     : np.concatenate(ps),
+        "q"     : np.concatenate(qs),
+        "start" : np.concatenate(starts),
+        "weight": np.concatenate(weights),
+    }
 
-    return position, actual_interval
 
 # Wrapper function to only obtain nearest position on curve to point.
 nearest_position_on_curve_to_point = lambda curve, point: nearest_position_and_interval_on_curve_to_point(curve, point)[0]
@@ -623,6 +941,16 @@ def graph_distance_node_edge(G, nid, eid):
     curvepoint = nearest_position_on_curve_to_point(curve, point)
     return norm(point - curvepoint)
 
+# Compute distance between node and each edge (at once).
+def graph_distances_node_edges(G, nid, eids):
+    if len(eids) == 0:
+        return np.zeros(0)
+    point = graphnode_position(G, nid)
+    curves = [np.asarray(graphedge_curvature(G, eid), dtype=np.float64) for eid in eids]
+    offsets = np.concatenate(([0], np.cumsum([len(curve) for curve in curves])))
+    _, _, distances = project_points_onto_curves(np.tile(point, (len(eids), 1)), np.concatenate(curves), offsets)
+    return distances
+
 @info()
 def graph_distance_node_node(G, u, v):
     p = graphnode_position(G, u)
@@ -634,7 +962,7 @@ def graph_distance_node_node(G, u, v):
 def nearest_node(G, nid, node_tree=None, excluded_nids=set()):
 
     if node_tree == None:
-        node_tree = graphnodes_to_rtree(G)
+        node_tree = graph_node_rtree(G)
 
     bbox = graphnode_to_bbox(G, nid)
 
@@ -655,7 +983,7 @@ def nearest_node(G, nid, node_tree=None, excluded_nids=set()):
 def nearest_edge(G, nid, edge_tree=None, excluded_eids=set()):
 
     if edge_tree == None:
-        edge_tree = graphedges_to_rtree(G)
+        edge_tree = graph_edge_rtree(G)
 
     # Seek distance to edge of first hit.
     bbox = graphnode_to_bbox(G, nid)
@@ -678,10 +1006,11 @@ def nearest_edge(G, nid, edge_tree=None, excluded_eids=set()):
     eids = intersect_rtree_bbox(edge_tree, bbox)
 
     # Rerun against all edges and return lowest.
-    distances = [(eid, graph_distance_node_edge(G, nid, eid)) for eid in eids if eid not in to_exclude]
+    eids = [eid for eid in eids if eid not in to_exclude]
+    distances = graph_distances_node_edges(G, nid, eids)
 
     # Obtain lowest
-    eid, distance = min(distances, key=lambda x: x[1])
+    eid = eids[int(np.argmin(distances))]
 
     return eid
 
@@ -701,8 +1030,66 @@ def unzip(data):
 ### Sanity check functionality
 #######################################
 
+## Validation level.
+
+# Validation level of `check` statements and `sanity_check_*` functions throughout the pipeline.
+# * "off": Skip all checks (trusted inputs in production).
+# * "cheap": Only run checks of constant cost (single `check` statements), skip sanity checks iterating the entire graph.
+# * "full": Run all checks, including the per-node/per-edge sanity checks on hot paths.
+# Defaults to "full" (every check runs), production runs opt into "cheap" or "off" with `set_validation_level`.
+# Note: `check` only guards internal invariants, invalid arguments of a caller raise an exception regardless of the validation level.
+validation_levels = ["off", "cheap", "full"]
+validation = {"level": "full"}
+
+
+# Set the global validation level.
+def set_validation_level(level):
+    if level not in validation_levels:
+        raise Exception(f"Expect validation level to be one of {validation_levels}, got '{level}'.")
+    validation["level"] = level
+
+
+# Whether checks at the provided validation level are to be run.
+def validate(level="cheap"):
+    return validation_levels.index(validation["level"]) >= validation_levels.index(level)
+
+
+# Temporarily run under a different validation level.
+@contextmanager
+def validation_level(level):
+    previous = validation["level"]
+    set_validation_level(level)
+    try:
+        yield
+    finally:
+        validation["level"] = previous
+
+
+# Verifier pass: Run all sanity checks on a graph (regardless of the current validation level).
+# * Meant to run separately on (untrusted) inputs and results when the pipeline itself runs with cheap (or no) validation.
+@info()
+def verify_graph(G):
+
+    with validation_level("full"):
+
+        graph_sanity_check(G)
+
+        if all(["curvature" in attrs for _, attrs in iterate_edges(G)]):
+            sanity_check_curvature_type(G)
+            sanity_check_graph_curvature(G)
+
+        if all(["length" in attrs for _, attrs in iterate_edges(G)]):
+            sanity_check_edge_length(G)
+
+
+## Sanity checks.
+
 # Perform a few sanity checks on the graph to prevent computation errors down the line.
 def graph_sanity_check(G):
+
+    if not validate("full"):
+        return
+
     print("Check graph.")
 
     # Simplification.
@@ -723,7 +1110,7 @@ def graph_sanity_check(G):
 
     # Nodes.
     sanity_check_node_positions(G)
-    nodes = extract_node_positions_dictionary(G)
+    nodes = extract_node_positions_list(G)
     if G.graph["coordinates"] == "utm":
         if np.min(nodes) < 100: 
             print(nodes)
@@ -757,13 +1144,13 @@ def graph_sanity_check(G):
     if G.graph["simplified"]: 
         for eid, attrs in iterate_edges(G):
             a, b, k = eid
-            ps = edge_curvature(G, a, b, k)
+            ps = graphedge_curvature(G, eid)
             if G.graph["coordinates"] == "latlon": # Convert to utm for computing in meters.
                 ps = array([latlon_to_coord(latlon) for latlon in ps])
             if curve_length(ps) > 1000: # Expect reasonable curvature length.
                 raise Exception("Expect edge length less than 1000 meters. Probably some y, x coordinate in edge curvature got flipped.")
             # Expect start and endpoint of edge curvature match the node position.
-            ps = edge_curvature(G, a, b, k) # Expect startpoint matches curvature.
+            ps = graphedge_curvature(G, eid) # Expect startpoint matches curvature.
             try:
                 if (not np.all(ps[0] == nodes[a])) and (not np.all(ps[-1] != nodes[b])):
                     raise Exception("Expect curvature have same directionality as edge start and end edge.")
@@ -772,18 +1159,25 @@ def graph_sanity_check(G):
                 print(e)
                 breakpoint()
             
-            assert "geometry" in attrs
             assert "curvature" in attrs
 
 
 # Sanity check that all curvature annotations are numpy array.
 def sanity_check_curvature_type(G):
+
+    if not validate("full"):
+        return
+
     for eid, attrs in iterate_edges(G):
         check(type(attrs["curvature"]) == type(array([])))
 
 
 # Sanity check all edges have non-zero edge length.
 def sanity_check_edge_length(G):
+
+    if not validate("full"):
+        return
+
     for eid, attrs in iterate_edges(G):
         check(attrs["length"] > 0)
 
@@ -791,6 +1185,9 @@ def sanity_check_edge_length(G):
 # Sanity check nodes have unique position.
 def sanity_check_node_positions(G, eps=0.0001):
 
+    if not validate("full"):
+        return
+
     assert G.graph["coordinates"] == "utm" # Act only on UTM for epsilon to make sense.
 
     positions = extract_node_positions_dictionary(G)
@@ -808,6 +1205,9 @@ def sanity_check_node_positions(G, eps=0.0001):
 # Sanity check graph curvature starts/end at node positions _and_ in the correct direction (starting at `u` and ending at `v` with `u <= v`).
 def sanity_check_graph_curvature(G):
 
+    if not validate("full"):
+        return
+
     nid_positions = extract_node_positions_dictionary(G)
     for eid, attrs in iterate_edges(G):
         check("curvature" in attrs, expect="Expect every edge to have 'curvature' attribute annotation.")
@@ -819,7 +1219,10 @@ def sanity_check_graph_curvature(G):
         check(np.all(q == ps[-1]), expect="Expect curvature of all connected edges starts/end at node position.")
 
 # Assert with a breakpoint, so we can debug if an exception occurs.
+# * Skipped with validation turned off (for costly statements, guard the call itself with `validate()`).
 def check(statement, expect=None):
+    if not validate("cheap"):
+        return
     try:
         assert statement
     except:
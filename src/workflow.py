@@ -388,8 +388,9 @@ def workflow_construct_image_and_pixelcoordinates(place=None, gsd_goal=0.5, devi
     pickle.dump(coordinates, open(f"data/satellite images and the pixel coordinates/{place}.pkl", "wb"))
 
 # Remove nodes and edges with `{"render": "deleted"}` attribute.
-def remove_deleted(G):
-    G = G.copy()
+# * With `inplace` they are removed from the graph itself (see `graph_to_transform`).
+def remove_deleted(G, inplace=False):
+    G = graph_to_transform(G, inplace=inplace)
     edges_to_be_deleted = filter_eids_by_attribute(G, filter_attributes={"render": "deleted"})
     nodes_to_be_deleted = filter_nids_by_attribute(G, filter_attributes={"render": "deleted"})
     G.remove_edges_from(edges_to_be_deleted)